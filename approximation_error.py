@@ -0,0 +1,39 @@
+import timeit
+import numpy as np
+from utilities import random_country, regular_n_gon
+
+#Estimator error of Country.screen_depots against the nn_tour times it stands in for,
+#to choose the screen_size of best_depot_site(method = 'approx') against a latency budget.
+#For each benchmark Country and estimator this reports:
+# - the mean and worst relative error of the estimates
+# - the screen_size needed for the true best depot to make the shortlist
+# - the time to screen every depot, and the time per depot of refining with nn_tour
+benchmarks = {
+    'regular_n_gon(16)': regular_n_gon(16),
+    'regular_n_gon(64)': regular_n_gon(64),
+    'random 50 settlements, 10 depots': random_country(50, 10, seed=1),
+    'random 100 settlements, 20 depots': random_country(100, 20, seed=2),
+    'random 200 settlements, 30 depots': random_country(200, 30, seed=3),
+}
+
+estimators = ['sample', 'mst']
+
+print(f'{"benchmark":<36}{"estimator":<11}{"mean error":>11}{"max error":>11}{"needed m":>10}{"screen (s)":>12}{"nn_tour (s)":>13}')
+
+for name, country in benchmarks.items():
+    depots = country.depots
+    #rank_depot_candidates gives the nn_tour time of every depot in one call
+    true_times = dict(country.rank_depot_candidates(depots))
+    true_times = np.array([true_times[depot] for depot in depots])
+    true_best = min(range(len(depots)), key=lambda i: (true_times[i], depots[i].name, depots[i].region))
+    nn_tour_time = timeit.timeit('country.nn_tour(depots[0])', globals=globals(), number=1)
+
+    for estimator in estimators:
+        screen_time = timeit.timeit('country.screen_depots(estimator)', globals=globals(), number=1)
+        estimates = country.screen_depots(estimator)
+
+        relative_error = np.abs(estimates - true_times) / true_times
+        shortlist = sorted(range(len(depots)), key=lambda i: (estimates[i], depots[i].name, depots[i].region))
+        needed_m = shortlist.index(true_best) + 1
+
+        print(f'{name:<36}{estimator:<11}{relative_error.mean():>11.1%}{relative_error.max():>11.1%}{needed_m:>10}{screen_time:>12.4f}{nn_tour_time:>13.4f}')
@@ -0,0 +1,162 @@
+"""
+Batch evaluation of many small Countries (e.g. one per week and per scenario) in one job.
+
+The Countries are packed into padded arrays, a chunk at a time, so that the travel times and the
+nn_tour from every depot of every Country in the chunk are computed with whole-array NumPy
+operations instead of a Python loop per Country. Chunks are shared out over a pool of worker
+processes, which only receive the packed arrays, and results stream back in input order.
+"""
+from __future__ import annotations
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from country import DEFAULT_MODEL, Tour
+from utilities import read_country_data
+
+BATCH_SIZE = 256
+
+
+def _pack(countries):
+    """
+    Packs a list of Countries into arrays padded to the largest Country, with a leading
+    Country axis. Padding is marked by "valid" being False.
+    """
+    n = max(len(country.all_locations) for country in countries)
+    packed = {
+        'r': np.zeros((len(countries), n)),
+        'r_squared': np.zeros((len(countries), n)),
+        'theta': np.zeros((len(countries), n)),
+        'region_codes': np.full((len(countries), n), -1, dtype=np.int64),
+        'region_counts': np.zeros((len(countries), n), dtype=np.int64),
+        'rank': np.zeros((len(countries), n), dtype=np.int64),
+        'depot': np.zeros((len(countries), n), dtype=bool),
+        'valid': np.zeros((len(countries), n), dtype=bool),
+        'tie_tolerance': np.array([country.tie_tolerance for country in countries], dtype=float),
+    }
+    for b, country in enumerate(countries):
+        size = len(country.all_locations)
+        packed['r'][b, :size] = country._r
+        packed['r_squared'][b, :size] = country._r_squared
+        packed['theta'][b, :size] = country._theta
+        packed['region_codes'][b, :size] = country._region_codes
+        packed['region_counts'][b, :size] = country._region_counts
+        packed['rank'][b, :size] = country._rank
+        packed['depot'][b, :size] = [location.depot for location in country.all_locations]
+        packed['valid'][b, :size] = True
+    return packed
+
+
+def _batch_best_depots(packed, model = DEFAULT_MODEL):
+    """
+    Runs nn_tour from every depot of every packed Country at once and picks each Country's best depot,
+    with the same (time, name, region) tie-break as best_depot_site, within each Country's tie_tolerance.
+    Each (Country, depot) pair is a lane; every step picks the next settlement for all lanes together.
+    Returns the best depot index, its tour (as location indices) and its tour time for each Country.
+    """
+    r, r_squared, theta = packed['r'], packed['r_squared'], packed['theta']
+    n_countries, n = r.shape
+    big = np.iinfo(np.int64).max
+    #Every time within the relative tolerance of the fastest is a tie, as in _tie_break
+    tolerance = 1 + packed['tie_tolerance']
+
+    #(countries, origins, destinations) travel times; the diagonal and padding are never used
+    with np.errstate(invalid='ignore'):
+        distance = np.sqrt(r_squared[:, :, None] + r_squared[:, None, :] - 2*r[:, :, None]*r[:, None, :]*np.cos(theta[:, :, None] - theta[:, None, :]))
+    same_region = packed['region_codes'][:, :, None] == packed['region_codes'][:, None, :]
+    times = model.times(distance, same_region, packed['region_counts'][:, None, :])
+
+    #Lanes: the depots of each Country, padded to the Country with the most depots
+    depot = packed['depot'] & packed['valid']
+    n_lanes = max(int(depot.sum(axis=1).max()), 1)
+    lane_depot = np.zeros((n_countries, n_lanes), dtype=np.int64)
+    lane_active = np.zeros((n_countries, n_lanes), dtype=bool)
+    for b in range(n_countries):
+        depots = np.flatnonzero(depot[b])
+        lane_depot[b, :len(depots)] = depots
+        lane_active[b, :len(depots)] = True
+
+    settlement = ~packed['depot'] & packed['valid']
+    n_steps = int(settlement.sum(axis=1).max())
+    country_axis = np.arange(n_countries)[:, None]
+
+    visited = np.broadcast_to(~settlement[:, None, :], (n_countries, n_lanes, n)).copy()
+    current = lane_depot.copy()
+    tour_time = np.zeros((n_countries, n_lanes))
+    tours = np.empty((n_countries, n_lanes, n_steps + 2), dtype=np.int64)
+    tours[:, :, 0] = lane_depot
+
+    for step in range(n_steps):
+        row = np.where(visited, np.inf, times[country_axis, current])
+        fastest = row.min(axis=2)
+        ties = row <= (fastest*tolerance[:, None])[:, :, None]
+        choice = np.argmin(np.where(ties, packed['rank'][:, None, :], big), axis=2)
+
+        #Lanes of Countries with fewer settlements have finished, and stay where they are
+        moving = ~np.isinf(fastest)
+        current = np.where(moving, choice, current)
+        tour_time = np.where(moving, tour_time + fastest, tour_time)
+        visited[country_axis, np.arange(n_lanes), current] |= moving
+        tours[:, :, step + 1] = current
+
+    tour_time = tour_time + times[country_axis, current, lane_depot]
+    tours[:, :, -1] = lane_depot
+
+    #Best lane of each Country, by time and then by the depot's rank
+    lane_time = np.where(lane_active, tour_time, np.inf)
+    ties = lane_time <= lane_time.min(axis=1, keepdims=True)*tolerance[:, None]
+    best_lane = np.argmin(np.where(ties, packed['rank'][country_axis, lane_depot], big), axis=1)
+
+    best = np.arange(n_countries)
+    return lane_depot[best, best_lane], tours[best, best_lane], tour_time[best, best_lane]
+
+
+def evaluate_countries(countries, processes = 1, batch_size = BATCH_SIZE, model = DEFAULT_MODEL):
+    """
+    Finds the best depot of each of many Countries, as best_depot_site does for one.
+    Countries can be given as Country objects or as paths to read with read_country_data.
+    The Countries are evaluated batch_size at a time, in a pool of worker processes when processes > 1,
+    with travel times from the given travel time model.
+    This is a generator: it yields (position, best depot, tour, tour time) for each Country, in input order,
+    as each batch finishes.
+    """
+    def batches():
+        batch = []
+        for position, country in enumerate(countries):
+            if not hasattr(country, 'all_locations'):
+                country = read_country_data(country)
+            if not country.depots:
+                raise ValueError(f'Country {position} contains no depots')
+            batch.append(country)
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    position = 0
+
+    def results(batch, outputs):
+        nonlocal position
+        for country, depot, tour, tour_time in zip(batch, *outputs):
+            #Tours of Countries smaller than the largest in the batch repeat their last stop
+            tour = tour[np.r_[True, tour[1:-1] != tour[:-2], True]]
+            locations = country.all_locations
+            yield position, locations[depot], Tour(locations, tour), float(tour_time)
+            position += 1
+
+    if processes > 1:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            pending = []
+            for batch in batches():
+                pending.append((batch, executor.submit(_batch_best_depots, _pack(batch), model)))
+                #Keep a couple of batches per worker in flight, yielding finished ones as we go
+                while len(pending) > 2*processes:
+                    batch, future = pending.pop(0)
+                    yield from results(batch, future.result())
+            for batch, future in pending:
+                yield from results(batch, future.result())
+    else:
+        for batch in batches():
+            yield from results(batch, _batch_best_depots(_pack(batch), model))
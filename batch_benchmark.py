@@ -0,0 +1,19 @@
+import timeit
+from batch import evaluate_countries
+from utilities import random_country
+
+#Throughput of batch.evaluate_countries against looping over best_depot_site, for many
+#variant Countries about the size of data/locations.csv (14 settlements, 5 depots)
+n_countries = 500
+countries = [random_country(14, 5, seed=seed) for seed in range(n_countries)]
+
+loop_time = timeit.timeit('[country.best_depot_site(False) for country in countries]', globals=globals(), number=1)
+print(f'Looping over best_depot_site: {n_countries / loop_time:.0f} countries/s')
+
+for batch_size in [16, 64, 256]:
+    batch_time = timeit.timeit('list(evaluate_countries(countries, batch_size=batch_size))', globals=globals(), number=1)
+    print(f'evaluate_countries, batch_size={batch_size}: {n_countries / batch_time:.0f} countries/s ({loop_time / batch_time:.1f}x)')
+
+for processes in [2, 4]:
+    batch_time = timeit.timeit('list(evaluate_countries(countries, processes=processes, batch_size=64))', globals=globals(), number=1)
+    print(f'evaluate_countries, {processes} processes: {n_countries / batch_time:.0f} countries/s ({loop_time / batch_time:.1f}x)')
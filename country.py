@@ -1,8 +1,13 @@
 from __future__ import annotations
 from typing import TYPE_CHECKING, List, Optional
-from plotting_utilities import plot_country, plot_path
+from collections.abc import Sequence
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from plotting_utilities import plot_country, plot_path, polar_to_xy
+import functools
 import numpy as np
 import pandas as pd
+import random
+import time
 import warnings
 
 if TYPE_CHECKING:
@@ -30,6 +35,280 @@ def travel_time(
     return float((1/3600)*(distance/speed)*(1+(different_regions*locations_in_dest_region)/10))
 
 
+class TravelTimeModel:
+    """
+    Base class for travel time models, which Country methods take through their model argument.
+
+    A model gives travel times (in hours) from:
+    1) distance - the distance in meters between the two locations.
+    2) same_region - True if the two locations are in the same region.
+    3) locations_in_dest_region - the number of locations in the destination region (including the destination itself).
+
+    Subclasses implement times, the array form, which the Country algorithms call with whole NumPy arrays
+    (or anything that broadcasts) so that a custom model adds no per-pair Python overhead.
+    Calling a model gives the scalar form, used by Country.travel_time; override __call__ if a
+    scalar-only version is faster. Models are sent to worker processes, so they must be picklable.
+    """
+    def times(self, distance, same_region, locations_in_dest_region):
+        raise NotImplementedError
+
+    def __call__(self, distance, same_region, locations_in_dest_region):
+        return float(self.times(distance, same_region, locations_in_dest_region))
+
+
+class RegionPenaltyModel(TravelTimeModel):
+    """
+    Travel at a constant speed (in meters per second), with a penalty for travelling between regions
+    that grows with the number of locations in the destination region: the time is multiplied by
+    1 + locations_in_dest_region/penalty_scale.
+    The default values give exactly the same times as the module-level travel_time.
+    """
+    def __init__(self, speed = 4.75, penalty_scale = 10):
+        self.speed = speed
+        self.penalty_scale = penalty_scale
+
+    def times(self, distance, same_region, locations_in_dest_region):
+        different_regions = np.logical_not(same_region)
+        return (1/3600)*(distance/self.speed)*(1+(different_regions*locations_in_dest_region)/self.penalty_scale)
+
+    def __call__(self, distance, same_region, locations_in_dest_region):
+        return float((1/3600)*(distance/self.speed)*(1+((not same_region)*locations_in_dest_region)/self.penalty_scale))
+
+
+DEFAULT_MODEL = RegionPenaltyModel()
+
+
+def _column_to_numpy(column):
+    """
+    Converts a pyarrow column to a float64 NumPy array, without copying when Arrow allows it
+    (a single float64 chunk with no nulls).
+    """
+    if column.num_chunks == 1 and column.null_count == 0 and str(column.type) == 'double':
+        return column.chunk(0).to_numpy(zero_copy_only=True)
+    return np.asarray(column.to_numpy(), dtype=float)
+
+
+def _validated(method):
+    """
+    Decorator for the Country methods covered by the validation mode (see Country.enable_validation).
+    When it is off this only costs a check of validation_rate.
+    """
+    @functools.wraps(method)
+    def validated_method(self, *args, **kwargs):
+        result = method(self, *args, **kwargs)
+        if self.validation_rate and self._validation_random.random() < self.validation_rate:
+            from validation import check
+            check(self, method.__name__, args, kwargs, result)
+        return result
+    return validated_method
+
+
+def _parallel_map(function, processes, *iterables):
+    """
+    Maps a module-level function over the inputs, in a pool of worker processes if processes > 1.
+    """
+    if processes > 1:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            return list(executor.map(function, *iterables))
+    return list(map(function, *iterables))
+
+
+def _tie_break(times, rank, tolerance = 0.0, axis = None):
+    """
+    Position of the fastest of the given times, breaking ties with the lowest rank, along axis.
+    With a relative tolerance, every time within tolerance*fastest of the fastest counts as a tie, so the
+    choice doesn't depend on the last bits of the times (e.g. on symmetric Countries such as regular_n_gon,
+    or between float32 and float64). A tolerance larger than the rounding error of the times, such as 1e-6,
+    makes the choice the same whichever precision they were computed in.
+    """
+    fastest = times.min(axis=axis, keepdims=axis is not None)
+    ties = times <= fastest*(1 + tolerance) if tolerance else times == fastest
+    return np.argmin(np.where(ties, rank, np.iinfo(np.int64).max), axis=axis)
+
+
+def _nn_order(times, rank, tolerance = 0.0):
+    """
+    Nearest neighbour order through a block of travel times, starting from the first location.
+    Ties (within the relative tolerance, as in _tie_break) are broken using the (name, region) rank of each location.
+    Kept at module level so that it can be sent to worker processes.
+    Returns the visiting order as positions into the block.
+    """
+    n = len(times)
+    if n == 0:
+        return np.empty(0, dtype=np.int64)
+
+    visited = np.zeros(n, dtype=bool)
+    order = np.empty(n, dtype=np.int64)
+    current = 0
+    for step in range(n):
+        order[step] = current
+        visited[current] = True
+        if step == n - 1:
+            break
+        current = int(_tie_break(np.where(visited, np.inf, times[current]), rank, tolerance))
+    return order
+
+
+def _nn_cycle(r, r_squared, theta, rank, region_size, model, tolerance = 0.0):
+    """
+    Nearest neighbour cycle through a group of locations that all lie in the same region (of
+    region_size locations), starting from the first location given. As every trip stays in the region,
+    the travel times only need the coordinates of the group.
+    """
+    #The diagonal is never used
+    with np.errstate(invalid='ignore'):
+        distance = np.sqrt(r_squared[:, None] + r_squared[None, :] - 2*r[:, None]*r[None, :]*np.cos(theta[:, None] - theta[None, :]))
+    return _nn_order(model.times(distance, True, region_size), rank, tolerance)
+
+
+def _rebuilt_tour_times(base_times, penalty_times, groups, ranks, seeds, speed_spread, penalty_spread, tolerance = 0.0):
+    """
+    For each seed, draws speed and penalty factors for every pair of locations, and rebuilds the
+    nearest neighbour tour of each group (a depot followed by its settlements) on the perturbed times.
+    Kept at module level so that it can be sent to worker processes.
+    Returns the (seeds, groups) tour times.
+    """
+    tour_times = np.empty((len(seeds), len(groups)))
+    for sample, seed in enumerate(seeds):
+        rng = np.random.default_rng(seed)
+        speed = np.exp(rng.normal(0.0, speed_spread, base_times.shape))
+        penalty = np.exp(rng.normal(0.0, penalty_spread, base_times.shape))
+        times = (base_times + penalty*penalty_times)/speed
+
+        for g, (group, rank) in enumerate(zip(groups, ranks)):
+            block = times[np.ix_(group, group)]
+            order = _nn_order(block, rank, tolerance)
+            tour_positions = order.tolist() + [0]
+            tour_times[sample, g] = sum(block[tour_positions[:-1], tour_positions[1:]].tolist())
+    return tour_times
+
+
+def _timed_tour_time(country, start, deadline, model):
+    """
+    nn_tour time from the location at index start, or None if the deadline (from time.time())
+    passes before the tour is finished. The deadline is checked at every stop.
+    """
+    tour_time = None
+    for _, _, tour_time in country._iter_nn_tour_indices(start, model=model):
+        if deadline is not None and time.time() > deadline:
+            return None
+    return tour_time
+
+
+#Country held by each worker process of search_depot_sites, set once by the pool initializer
+_worker_country = None
+
+
+def _set_worker_country(country):
+    global _worker_country
+    _worker_country = country
+
+
+def _worker_tour_time(start, deadline, model):
+    return _timed_tour_time(_worker_country, start, deadline, model)
+
+
+def _candidate_tour_time(times, settlement_positions, rank, tolerance, start):
+    """
+    nn tour time from position start of a shared block of travel times, through the settlement
+    positions other than start. Only this tour's block is sliced out of the shared times.
+    """
+    group = np.concatenate(([start], settlement_positions[settlement_positions != start]))
+    order = _nn_order(times[np.ix_(group, group)], rank[group], tolerance)
+    tour_positions = group[order].tolist() + [start]
+    return sum(times[tour_positions[:-1], tour_positions[1:]].tolist())
+
+
+#Shared travel times held by each worker process of rank_depot_candidates, set once by the pool initializer
+_worker_candidate_times = None
+
+
+def _set_worker_candidate_times(times, settlement_positions, rank, tolerance):
+    global _worker_candidate_times
+    _worker_candidate_times = (times, settlement_positions, rank, tolerance)
+
+
+def _worker_candidate_tour_time(start):
+    return _candidate_tour_time(*_worker_candidate_times, start)
+
+
+#Share of the time left that search_depot_sites may spend screening depots
+SCREEN_SHARE = 0.1
+
+#Closed depots tried in place of each open one per swap pass of best_depot_sites, fewest assignment hours first
+SWAP_CANDIDATES = 8
+
+#States of nn tours are memoized every NN_MEMO_STRIDE stops, with at most NN_MEMO_STOPS_PER_SETTLEMENT
+#stops held in the memo per settlement (see Country._iter_nn_tours)
+NN_MEMO_STRIDE = 16
+NN_MEMO_STOPS_PER_SETTLEMENT = 8
+
+MAX_EXACT_SETTLEMENTS = 16
+#Memory the Held-Karp tables may take at once; the depots are solved in chunks that fit
+MAX_EXACT_TABLE_BYTES = 64*2**20
+
+
+def _held_karp_bytes(n_depots, n):
+    """
+    Estimated peak memory of _held_karp for n_depots depots and n settlements: the float64 cost and
+    int8 parent tables, with at most as much again for the float64 candidates of one layer.
+    """
+    return n_depots*(1 << n)*n*(8 + 1 + 8)
+
+
+def _held_karp(start_times, times, return_times):
+    """
+    Exact (Held-Karp) bitmask dynamic programming over the settlements, run for several start
+    depots at once. The tables carry a leading depot axis, so every subset layer is filled for
+    all depots in one vectorized step rather than repeating the whole search per depot.
+
+    Inputs:
+    1) start_times - (depots, settlements) travel times from each depot to each settlement.
+    2) times - (settlements, settlements) travel times between settlements.
+    3) return_times - (depots, settlements) travel times from each settlement back to each depot.
+
+    Returns the optimal visiting order of the settlements for each depot, as a (depots, settlements)
+    array of positions, along with the corresponding tour times.
+    """
+    n_depots, n = start_times.shape
+    full = (1 << n) - 1
+
+    times = np.array(times, dtype=float)
+    np.fill_diagonal(times, np.inf)
+
+    masks = np.arange(1 << n)
+    popcount = np.zeros(1 << n, dtype=np.int64)
+    for j in range(n):
+        popcount += (masks >> j) & 1
+
+    #cost[d, S, j] is the fastest path from depot d through the settlements in S, ending at j
+    cost = np.full((n_depots, 1 << n, n), np.inf)
+    parent = np.full((n_depots, 1 << n, n), -1, dtype=np.int8)
+    for j in range(n):
+        cost[:, 1 << j, j] = start_times[:, j]
+
+    for size in range(2, n + 1):
+        layer = masks[popcount == size]
+        for j in range(n):
+            subsets = layer[(layer >> j) & 1 == 1]
+            candidates = cost[:, subsets ^ (1 << j), :] + times[:, j]
+            best = np.argmin(candidates, axis=2)
+            cost[:, subsets, j] = np.take_along_axis(candidates, best[..., None], axis=2)[..., 0]
+            parent[:, subsets, j] = best
+
+    totals = cost[:, full, :] + return_times
+    last = np.argmin(totals, axis=1)
+    tour_times = totals[np.arange(n_depots), last]
+
+    orders = np.empty((n_depots, n), dtype=np.int64)
+    for d in range(n_depots):
+        mask, j = full, int(last[d])
+        for step in range(n - 1, -1, -1):
+            orders[d, step] = j
+            mask, j = mask ^ (1 << j), int(parent[d, mask, j])
+    return orders, tour_times
+
+
 class Location:
     def __init__(self, name : str, region : str, r : float, theta : float, depot : bool):
         
@@ -126,7 +405,53 @@ class Location:
         """
         return hash(self.name + self.region)
 
+class Tour(Sequence):
+    """
+    A tour stored as an int32 array of indices into a Country's Locations.
+    It behaves as a read-only list of Locations, only looking each Location up when it is accessed,
+    and compares equal to a list of the same Locations.
+    """
+    __slots__ = ('_locations', 'indices')
+
+    def __init__(self, locations, indices):
+        self._locations = locations
+        self.indices = np.asarray(indices, dtype=np.int32)
+
+    def __len__(self):
+        return len(self.indices)
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return Tour(self._locations, self.indices[position])
+        return self._locations[self.indices[position]]
+
+    def __iter__(self):
+        locations = self._locations
+        for i in self.indices.tolist():
+            yield locations[i]
+
+    def __eq__(self, other):
+        if isinstance(other, Tour):
+            return list(self) == list(other)
+        if isinstance(other, (list, tuple)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return repr(list(self))
+
+
 class Country:
+    #Relative tolerance within which travel and tour times count as tied, for the (name, region) tie-break
+    tie_tolerance = 0.0
+    #Cartesian coordinates of the compact mode, None when distances come from the polar coordinates
+    _x = None
+    _y = None
+    #Share of calls checked against the reference implementations by the validation mode
+    validation_rate = 0.0
+
     def __init__(self, list_of_locations):
 
         if isinstance(list_of_locations, pd.DataFrame):
@@ -144,7 +469,216 @@ class Country:
                 raise ValueError('Duplicate locations found')
             
             self._all_locations = tuple(list_of_locations)
-                   
+
+        self._build_arrays()
+
+    def _build_arrays(self, r = None, theta = None):
+        """
+        Caches the columnar form of the Country's Locations (coordinates, region codes,
+        region sizes and the (name, region) ordering) so vectorized methods don't have to
+        go back to the Location objects for every pair of Locations.
+        Coordinate arrays that are already available (e.g. from Arrow columns) can be passed in and are used as they are.
+        """
+        locations = self._all_locations
+        n = len(locations)
+
+        self._index = {location: i for i, location in enumerate(locations)}
+        self._r = np.array([location.r for location in locations], dtype=float) if r is None else r
+        self._theta = np.array([location.theta for location in locations], dtype=float) if theta is None else theta
+        #Squared with Python's float power (as in Location.distance_to) rather than NumPy's x*x,
+        #which can differ in the last bit
+        self._r_squared = np.array([location.r**2 for location in locations], dtype=float)
+
+        regions = np.array([location.region for location in locations], dtype=str)
+        self._region_names, self._region_codes = np.unique(regions, return_inverse=True)
+        self._region_codes = self._region_codes.astype(np.int64)
+        self._region_sizes = np.bincount(self._region_codes, minlength=len(self._region_names))
+        self._region_counts = self._region_sizes[self._region_codes]
+
+        order = sorted(range(n), key=lambda i: (locations[i].name, locations[i].region))
+        self._rank = np.empty(n, dtype=np.int64)
+        self._rank[order] = np.arange(n)
+
+    @classmethod
+    def from_arrow(cls, table):
+        """
+        Builds a Country from a pyarrow Table with the columns of data/locations.csv (location, r, theta,
+        region and, optionally, depot). The r and theta columns go straight into the Country's arrays,
+        without a copy when they are float64 columns in one chunk with no nulls. The Locations are still
+        built and validated as usual.
+        """
+        names = table.column('location').to_pylist()
+        if len(names) != len(set(names)):
+            raise ValueError('Duplicate locations found')
+
+        depots = table.column('depot').to_pylist() if 'depot' in table.column_names else [False]*len(names)
+        return cls._from_columns(names, table.column('region').to_pylist(), _column_to_numpy(table.column('r')),
+            _column_to_numpy(table.column('theta')), depots)
+
+    @classmethod
+    def _from_columns(cls, names, regions, r, theta, depots):
+        """
+        Builds a Country from columns that have already been checked for duplicate names,
+        keeping the r and theta arrays as the Country's coordinate arrays.
+        The depot values are given to Location as they are, so anything but a boolean is rejected.
+        """
+        country = cls.__new__(cls)
+        country._all_locations = tuple(Location(name, region, r_i, theta_i, depot)
+            for name, region, r_i, theta_i, depot in zip(names, regions, r.tolist(), theta.tolist(), depots))
+        country._build_arrays(r, theta)
+        return country
+
+    @classmethod
+    def from_parquet(cls, filepath):
+        """
+        Builds a Country from a Parquet file with the columns of data/locations.csv, memory mapping the file.
+        """
+        import pyarrow.parquet as pq
+
+        return cls.from_arrow(pq.read_table(filepath, memory_map=True))
+
+    def to_arrow(self):
+        """
+        Returns the Country's Locations as a pyarrow Table, with the columns of data/locations.csv.
+        Rows are in the order of all_locations, so row numbers match the location indices used in Tours
+        and the Parquet exports.
+        """
+        import pyarrow as pa
+
+        return pa.table({
+            'location': [location.name for location in self._all_locations],
+            'r': self._r,
+            'theta': self._theta,
+            'region': [location.region for location in self._all_locations],
+            'depot': [location.depot for location in self._all_locations],
+        })
+
+    def to_parquet(self, filepath):
+        import pyarrow.parquet as pq
+
+        pq.write_table(self.to_arrow(), filepath)
+
+    def _indices_of(self, locations):
+        """
+        Converts Locations to their positions in all_locations.
+        """
+        try:
+            return np.array([self._index[location] for location in locations], dtype=np.int64)
+        except KeyError as e:
+            raise ValueError(f'{e.args[0]} is not a location in this Country')
+
+    def _distances(self, origins, destinations):
+        """
+        Vectorized Location.distance_to over arrays of location indices, which are broadcast against each other.
+        """
+        if self._x is not None:
+            dx = self._x[origins] - self._x[destinations]
+            dy = self._y[origins] - self._y[destinations]
+            return np.sqrt(dx*dx + dy*dy).astype(float)
+
+        r1, r2 = self._r[origins], self._r[destinations]
+        return np.sqrt(self._r_squared[origins] + self._r_squared[destinations] - 2*r1*r2*np.cos(self._theta[origins] - self._theta[destinations]))
+
+    def use_compact_coordinates(self, dtype = np.float32):
+        """
+        Switches the Country's distance calculations to a compact mode, which caches the Cartesian
+        coordinates of every Location (as in plotting_utilities.polar_to_xy) in the given float dtype.
+        Each distance is then a subtraction, two multiply-adds and a square root instead of a cosine,
+        and float32 halves the memory read per distance. Distances are returned as float64, so travel
+        and tour times are still added up in float64. Passing dtype=None goes back to the polar coordinates.
+
+        Error bound: with u the unit roundoff of the dtype (2**-24 for float32, 2**-53 for float64) and
+        R the largest r in the Country, each compact distance d is within about 4*u*R + 2*u*d of the exact
+        distance. For float32 and the 100km scale of data/locations.csv that is under 3cm; for float64 the
+        compact distances are at least as accurate as the polar ones, which lose precision for nearby
+        Locations. Times that differ by less than this can come out in a different order, so results can
+        only differ from the polar float64 ones where two trips or tours are tied to within the bound;
+        setting tie_tolerance above the bound divided by the shortest distance makes such near-ties
+        go by name and region in both modes.
+        """
+        if dtype is None:
+            self._x = self._y = None
+            return
+        xy = polar_to_xy(np.column_stack((self._theta, self._r)))
+        self._x = xy[:, 0].astype(dtype)
+        self._y = xy[:, 1].astype(dtype)
+
+    def enable_validation(self, rate = 0.01, rtol = 0.0, seed = None):
+        """
+        Switches on the differential validation mode (see validation.py). A random share, rate, of calls to
+        the vectorized travel time kernel, fastest_trip_from, nn_tour and best_depot_site are checked against
+        a reference implementation, and any divergence is logged as a warning on the "validation" logger
+        with the inputs needed to reproduce it. Only a sampled part of each call is checked (one pair of a
+        travel time block, one step of a tour, or the chosen depot against one other depot), so a check costs
+        O(N) scalar travel times and two nn_tours at most.
+        Times count as agreeing within the relative tolerance rtol. In compact mode the compact error bound of
+        each trip (see use_compact_coordinates) is allowed on top of rtol, so the compact mode's rounding is not
+        reported as a divergence.
+        Counts of checks and divergences are kept in validation_stats. A rate of 0 switches it off.
+        """
+        self.validation_rate = rate
+        self.validation_rtol = rtol
+        self.validation_stats = {'checked': 0, 'divergences': 0}
+        self._validation_random = random.Random(seed)
+
+    @_validated
+    def _travel_times(self, origins, destinations, model = DEFAULT_MODEL):
+        """
+        Vectorized Country.travel_time over arrays of location indices.
+        The index arrays are broadcast against each other, so passing origins[:, None] and
+        destinations[None, :] gives the full block of travel times between the two groups.
+        """
+        distance = self._distances(origins, destinations)
+        same_region = self._region_codes[origins] == self._region_codes[destinations]
+        return model.times(distance, same_region, self._region_counts[destinations])
+
+    def _tour_time(self, tour_indices, model = DEFAULT_MODEL):
+        """
+        Total travel time along consecutive pairs of a tour given as location indices.
+        Legs are summed in order, as in nn_tour.
+        """
+        tour_indices = np.asarray(tour_indices, dtype=np.int64)
+        legs = self._travel_times(tour_indices[:-1], tour_indices[1:], model)
+        return sum(legs.tolist())
+
+    def _settlement_indices(self):
+        return np.array([i for i, location in enumerate(self._all_locations) if not location.depot], dtype=np.int64)
+
+    def _depot_indices(self):
+        return np.array([i for i, location in enumerate(self._all_locations) if location.depot], dtype=np.int64)
+
+    def _fastest_trips(self, origins, potential = None, model = DEFAULT_MODEL):
+        """
+        Vectorized fastest_trip_from for several origins at once, with the same tie-break.
+        By default the potential locations are the settlements other than the origin, as in fastest_trip_from.
+        Returns the index of the closest location and the travel time for each origin,
+        with -1 and inf where there is nowhere to go.
+        """
+        origins = np.asarray(origins, dtype=np.int64)
+        default = potential is None
+        potential = self._settlement_indices() if default else np.asarray(potential, dtype=np.int64)
+        if len(potential) == 0:
+            return np.full(len(origins), -1, dtype=np.int64), np.full(len(origins), np.inf)
+
+        times = self._travel_times(origins[:, None], potential[None, :], model)
+        if default:
+            times = np.where(potential[None, :] == origins[:, None], np.inf, times)
+
+        choice = _tie_break(times, self._rank[potential], self.tie_tolerance, axis=1)
+        fastest_times = times[np.arange(len(origins)), choice]
+        return np.where(np.isinf(fastest_times), -1, potential[choice]), fastest_times
+
+    def _nn_tour_indices(self, start, model = DEFAULT_MODEL):
+        """
+        nn_tour from the location at index start, returning the tour as a list of location indices
+        along with the tour time.
+        """
+        tour_indices = [int(start)]
+        tour_time = 0
+        for stop, _, tour_time in self._iter_nn_tour_indices(start, model=model):
+            tour_indices.append(stop)
+        return tour_indices, tour_time
+
     @property
     def all_locations(self):
         return self._all_locations
@@ -191,10 +725,10 @@ class Country:
         count = sum(1 for location in self._all_locations if location.region == region)
         return count
     
-    def travel_time(self, start_location, end_location):
+    def travel_time(self, start_location, end_location, model = DEFAULT_MODEL):
         """
         Method inputting a start and end location within the Country.
-        Returns the travel time between them in hours.
+        Returns the travel time between them in hours, using the scalar form of the travel time model.
         """
         if start_location not in self._all_locations:
             raise ValueError(f'{start_location} is not a location in this Country')
@@ -204,105 +738,490 @@ class Country:
         
         else:
             distance = Location.distance_to(start_location, end_location)
-
-            if start_location.region == end_location.region:
-                different_regions = 0
-            else:
-                different_regions = 1
+            same_region = start_location.region == end_location.region
 
             n_locations_in_region = self.locations_in_region(end_location.region)
-            time = travel_time(distance, different_regions, n_locations_in_region)
+            time = model(distance, same_region, n_locations_in_region)
 
             return time
 
-    def fastest_trip_from(self, current_location, potential_locations = None):
+    @_validated
+    def fastest_trip_from(self, current_location, potential_locations = None, model = DEFAULT_MODEL):
         """
         Method inputs a specified current location and a list of potential locations.
         The method computes the travel time between current location and each location in potential locations.
         The location with the shortest travel time is returned with its corresponding travel time.
         If no potential locations are specified, the method will default to all settlements in the Country.
+        The travel times to all of the potential locations are computed together with the array form of the model.
         """
         
         if potential_locations is None:
             potential_locations = [location for location in self.settlements if location != current_location]
         
-        travel_times = []
         travel_locations = []
 
         for location in potential_locations:
             if isinstance(location, Location):
-                time = self.travel_time(current_location, location)
-                travel_times.append(time)
                 travel_locations.append(location)
 
             elif isinstance(location, int):
                 if location > len(potential_locations):
                     raise ValueError('Integer provided is out of bounds')
                 else: 
-                    indexed_location = self.get_location(location)
-                    time = self.travel_time(current_location, indexed_location)
-                    travel_times.append(time)
-                    travel_locations.append(indexed_location)
-
-        fastest_time = np.min(travel_times)
-        min_indices = np.where(travel_times == fastest_time)[0]
-        closest_location_list = [travel_locations[i] for i in min_indices]
-
-        if len(closest_location_list) > 1:
-                sorted_closest_locations = sorted(closest_location_list, key = lambda location: (location.name, location.region))
-                closest_location = sorted_closest_locations[0]
+                    travel_locations.append(self.get_location(location))
+
+        if travel_locations == []:
+            return None, None
+
+        current_index = self._indices_of([current_location])[0]
+        travel_indices = self._indices_of(travel_locations)
+        travel_times = self._travel_times(current_index, travel_indices, model)
+
+        #Ties (within tie_tolerance) go to the first location by name and then region
+        closest = int(_tie_break(travel_times, self._rank[travel_indices], self.tie_tolerance))
+
+        return travel_locations[closest], travel_times[closest]
+
+
+    def _iter_nn_tour_indices(self, start, max_stops = None, model = DEFAULT_MODEL):
+        """
+        Generator behind iter_nn_tour and nn_tour, working with location indices.
+        Each step only computes the travel times from the current stop to the remaining settlements.
+        """
+        remaining = self._settlement_indices()
+        if max_stops is not None:
+            n_stops = min(max_stops, len(remaining))
         else:
-                closest_location = closest_location_list[0]
+            n_stops = len(remaining)
 
-        if potential_locations == []:
-                closest_location = None
-                fastest_time = None
+        current = start
+        cumulative_time = 0
+        for _ in range(n_stops):
+            times = self._travel_times(current, remaining, model)
+            choice = int(_tie_break(times, self._rank[remaining], self.tie_tolerance))
+            fastest_time = times[choice]
 
-        return closest_location, fastest_time
+            current = int(remaining[choice])
+            remaining = np.delete(remaining, choice)
+            cumulative_time = cumulative_time + fastest_time
+            yield current, fastest_time, cumulative_time
 
+        back_to_start_time = self._travel_times(current, start, model)
+        yield start, back_to_start_time, cumulative_time + back_to_start_time
 
-    def nn_tour(self, starting_depot):
+    def iter_nn_tour(self, starting_depot, max_stops = None, model = DEFAULT_MODEL):
+        """
+        Generator form of nn_tour, for dispatching a tour before all of it is known.
+        Yields (stop, time of the trip to it, total time so far) as each stop is chosen, ending with the
+        trip back to the starting depot. Each step searches the remaining settlements in one vectorized call,
+        so its Python overhead is constant, while the array work shrinks as settlements are visited.
+        The tour can be stopped early by no longer iterating, or limited to max_stops settlements
+        before heading back to the depot.
+        """
+        start = self._indices_of([starting_depot])[0]
+        for stop, leg_time, cumulative_time in self._iter_nn_tour_indices(start, max_stops, model):
+            yield self._all_locations[stop], leg_time, cumulative_time
+
+    @_validated
+    def nn_tour(self, starting_depot, model = DEFAULT_MODEL):
         """
         This method implements the nearest neighbours algorithm to return a time efficient tour between settlements
         in a Country, based on a specified starting depot. 
-        It uses the fastest_trip_from method to find the closest settlement and corresponding travel time.
+        At each step the closest remaining settlement is chosen, with the same tie-break as fastest_trip_from.
         This is iterated using the closest settlement as the new starting location at each iteration.
         This process repeats until there are no settlements remaining.
         The travel time from the final settlement back to the starting depot is calculated and recorded.
-        The output is a chronological list of Locations visited during the tour along with its total duration in hours.
+        The output is a chronological list of Locations visited during the tour (as a Tour, which holds
+        their indices) along with its total duration in hours.
+        The steps come from iter_nn_tour, and travel times from the given travel time model.
         """
-        settlements = list(self.settlements)
+        start = self._indices_of([starting_depot])[0]
+
+        tour = [start]
+        tour_time = 0
+        for stop, _, tour_time in self._iter_nn_tour_indices(start, model=model):
+            tour.append(stop)
+
+        return Tour(self._all_locations, tour), tour_time
 
-        tour = [starting_depot]
-        time_between_settlements = []
+    def _iter_nn_tours(self, depot_indices, model = DEFAULT_MODEL, stats = None):
+        """
+        Generator behind nn_tours, yielding (depot index, tour as a list of location indices, tour time)
+        for one depot at a time, so only the current tour is held in memory.
+        Once two tours reach the same settlement with the same settlements left to visit, the rest of their
+        tours is the same up to the trip back to the depot. Every NN_MEMO_STRIDE stops, the state of a tour is
+        looked up in a memo keyed on (current settlement, 128-bit hash of the visited settlements), updated
+        as each stop is added. A hit takes the rest of the tour from the memo, as a chain of segments of
+        stops and leg times between memoized states. The memo is shared by all the tours and holds at most
+        NN_MEMO_STOPS_PER_SETTLEMENT stops per settlement; tours that don't fit are not memoized.
+        The counts of hits, stops reused, stops computed and the seconds spent computing are added to stats.
+        """
+        n_settlements = len(self._settlement_indices())
+        rng = np.random.default_rng(0)
+        keys = [(high << 64) | low for high, low in zip(rng.integers(0, 2**63, len(self._all_locations)).tolist(),
+            rng.integers(0, 2**63, len(self._all_locations)).tolist())]
+        if stats is None:
+            stats = {}
+        for name in ('hits', 'stops_reused', 'stops_computed', 'compute_seconds'):
+            stats.setdefault(name, 0)
 
-        while settlements:
-            current_location = tour[-1]
-            next_settlement, time = self.fastest_trip_from(current_location, settlements)
-            tour.append(next_settlement)
-            time_between_settlements.append(time)
-            settlements.remove(next_settlement)
+        memo = {}
+        memo_stops = 0
+        for start in depot_indices:
+            start = int(start)
+            stops, legs, checkpoints = [], [], []
+            visited_hash = 0
+            cumulative_time = 0
+            hit = None
+            begin = time.perf_counter()
+            for stop, leg_time, total_time in self._iter_nn_tour_indices(start, model=model):
+                #The trip back to the depot is added below, once the rest of the tour is known
+                if len(stops) == n_settlements:
+                    break
+                cumulative_time = total_time
+                stops.append(stop)
+                legs.append(leg_time)
+                visited_hash ^= keys[stop]
+                if len(stops) % NN_MEMO_STRIDE == 0 and len(stops) < n_settlements:
+                    if (stop, visited_hash) in memo:
+                        hit = (stop, visited_hash)
+                        break
+                    checkpoints.append((len(stops), (stop, visited_hash)))
+            stats['compute_seconds'] += time.perf_counter() - begin
+            computed = len(stops)
+            stats['stops_computed'] += computed
 
-            if next_settlement is None:
-                break
+            #The times are added in the same order as nn_tour adds them
+            key = hit
+            while key is not None:
+                segment_stops, segment_legs, key = memo[key]
+                for stop, leg_time in zip(segment_stops.tolist(), segment_legs.tolist()):
+                    stops.append(stop)
+                    cumulative_time = cumulative_time + leg_time
+            if hit is not None:
+                stats['hits'] += 1
+                stats['stops_reused'] += len(stops) - computed
 
-        back_to_start_time = self.travel_time(tour[-1], starting_depot)
-        tour.append(starting_depot)
-        time_between_settlements.append(back_to_start_time)
+            #Each new memoized state holds the stops and legs up to the next one, or up to the hit
+            if checkpoints and memo_stops + computed - checkpoints[0][0] <= NN_MEMO_STOPS_PER_SETTLEMENT*n_settlements:
+                ends = [position for position, _ in checkpoints[1:]] + [computed]
+                next_keys = [key for _, key in checkpoints[1:]] + [hit]
+                for (position, key), end, next_key in zip(checkpoints, ends, next_keys):
+                    memo[key] = (np.array(stops[position:end], dtype=np.int32), np.array(legs[position:end]), next_key)
+                memo_stops += computed - checkpoints[0][0]
 
-        tour_time = sum(time_between_settlements)
+            cumulative_time = cumulative_time + self._travel_times(stops[-1] if stops else start, start, model)
+            yield start, [start] + stops + [start], cumulative_time
 
-        return tour, tour_time
+    def nn_tours(self, depots = None, model = DEFAULT_MODEL):
+        """
+        nn_tour from each of the given depots (by default every depot), sharing work between them through
+        a bounded memo of the states the tours pass through (see _iter_nn_tours).
+        The tours and times are identical to running nn_tour from each depot.
+
+        The output is a dictionary of:
+        1) "tours" and "tour_times" - the tour (as a Tour) and tour time from each depot.
+        2) "hits" - the number of tours that reused the rest of an earlier tour.
+        3) "stops_reused" - the number of stops taken from earlier tours instead of being computed.
+        4) "seconds_saved" - an estimate of the time saved, from the average time of a computed stop.
+        """
+        depot_indices = self._depot_indices() if depots is None else self._indices_of(depots)
+        stats = {}
+        tours, tour_times = [], []
+        for _, tour, tour_time in self._iter_nn_tours(depot_indices, model, stats):
+            tours.append(Tour(self._all_locations, tour))
+            tour_times.append(tour_time)
+
+        return {
+            'tours': tours,
+            'tour_times': tour_times,
+            'hits': stats['hits'],
+            'stops_reused': stats['stops_reused'],
+            'seconds_saved': stats['stops_reused']*stats['compute_seconds']/max(stats['stops_computed'], 1),
+        }
+
+    def exact_tour(self, starting_depot, max_settlements = MAX_EXACT_SETTLEMENTS, model = DEFAULT_MODEL):
+        """
+        Returns the fastest possible tour of the settlements from the specified starting depot,
+        found exactly with the Held-Karp dynamic programming algorithm, in the same form as nn_tour.
+        The DP tables grow as 2^N, so if the Country has more than max_settlements settlements
+        a warning is raised and the nn_tour result is returned instead.
+        """
+        tours, tour_times = self._exact_tours([starting_depot], max_settlements, model)
+        return tours[0], tour_times[0]
+
+    def _exact_tours(self, depots, max_settlements = MAX_EXACT_SETTLEMENTS, model = DEFAULT_MODEL):
+        """
+        Runs the Held-Karp solver for several depots, sharing one set of DP tables between them.
+        The tables grow with the number of depots as well as 2^N, so the depots are solved in chunks
+        whose tables fit in MAX_EXACT_TABLE_BYTES (at least one depot per chunk).
+        Falls back to nn_tour (with a warning) above max_settlements settlements.
+        """
+        depot_indices = self._indices_of(depots)
+        settlements = self._settlement_indices()
+
+        if len(settlements) > max_settlements:
+            warnings.warn(f'{len(settlements)} settlements is above the exact solver limit of {max_settlements}, using nn_tour instead')
+            tours_and_times = [self.nn_tour(depot, model) for depot in depots]
+            return [tour for tour, _ in tours_and_times], [tour_time for _, tour_time in tours_and_times]
+
+        if len(settlements) == 0:
+            tour_indices = [[d, d] for d in depot_indices]
+        else:
+            start_times = self._travel_times(depot_indices[:, None], settlements[None, :], model)
+            with np.errstate(invalid='ignore'):
+                times = self._travel_times(settlements[:, None], settlements[None, :], model)
+            return_times = self._travel_times(settlements[None, :], depot_indices[:, None], model)
+            chunk_size = max(1, MAX_EXACT_TABLE_BYTES//_held_karp_bytes(1, len(settlements)))
+            orders = np.concatenate([_held_karp(start_times[i:i + chunk_size], times, return_times[i:i + chunk_size])[0]
+                for i in range(0, len(depot_indices), chunk_size)])
+            tour_indices = [[d] + settlements[order].tolist() + [d] for d, order in zip(depot_indices, orders)]
+
+        tours = [Tour(self._all_locations, indices) for indices in tour_indices]
+        tour_times = [self._tour_time(indices, model) for indices in tour_indices]
+        return tours, tour_times
+
+    def screen_depots(self, estimator = 'sample', sample_fraction = 0.25, deadline = None, model = DEFAULT_MODEL):
+        """
+        Cheap estimates of the nn_tour time from each depot, in the order of Country.depots,
+        for screening depots before running full tours.
+
+        Estimators:
+        1) "sample" - an nn_tour through a stratified sample of the settlements, taking
+        sample_fraction of each region (at least one settlement), spread by angle. The sample tour
+        time is scaled up by sqrt(settlements / sampled settlements), as for random tours.
+        2) "mst" - a lower bound on any tour: the minimum spanning tree of the settlements (using the
+        quicker direction of each pair) plus the quickest trip out of and back into the depot.
+        The tree does not depend on the depot, so it is only computed once; depots are therefore
+        only told apart by their quickest trips out and back, and the estimate is a lower bound that
+        does not rank depots reliably.
+        If a deadline (a time.time() timestamp) is given and passes before the estimates are finished,
+        None is returned instead.
+        """
+        depots = self._depot_indices()
+        settlements = self._settlement_indices()
+        if estimator not in ('sample', 'mst'):
+            raise ValueError(f'Unknown estimator "{estimator}", expected "sample" or "mst"')
+
+        if len(settlements) == 0:
+            return np.zeros(len(depots))
+
+        if estimator == 'sample':
+            sample = []
+            for code in np.unique(self._region_codes[settlements]):
+                members = settlements[self._region_codes[settlements] == code]
+                members = members[np.lexsort((self._rank[members], self._theta[members]))]
+                size = max(1, int(round(sample_fraction*len(members))))
+                sample.extend(members[np.unique(np.linspace(0, len(members) - 1, size).round().astype(np.int64))])
+            sample = np.array(sample, dtype=np.int64)
+
+            estimates = []
+            for depot in depots:
+                if deadline is not None and time.time() > deadline:
+                    return None
+                group = np.concatenate(([depot], sample))
+                with np.errstate(invalid='ignore'):
+                    times = self._travel_times(group[:, None], group[None, :], model)
+                order = _nn_order(times, self._rank[group], self.tie_tolerance)
+                tour_positions = order.tolist() + [0]
+                estimates.append(sum(times[tour_positions[:-1], tour_positions[1:]].tolist()))
+            return np.array(estimates)*np.sqrt(len(settlements)/len(sample))
+
+        else:
+            with np.errstate(invalid='ignore'):
+                times = self._travel_times(settlements[:, None], settlements[None, :], model)
+            times = np.minimum(times, times.T)
+
+            #Prim's algorithm, updating the quickest link into the tree for every settlement at once
+            in_tree = np.zeros(len(settlements), dtype=bool)
+            link = np.full(len(settlements), np.inf)
+            link[0] = 0.0
+            tree_time = 0.0
+            for _ in range(len(settlements)):
+                if deadline is not None and time.time() > deadline:
+                    return None
+                nearest = int(np.argmin(np.where(in_tree, np.inf, link)))
+                tree_time += link[nearest]
+                in_tree[nearest] = True
+                link = np.minimum(link, times[nearest])
+
+            out_times = self._travel_times(depots[:, None], settlements[None, :], model).min(axis=1)
+            back_times = self._travel_times(settlements[None, :], depots[:, None], model).min(axis=1)
+            return tree_time + out_times + back_times
+
+    def simulate_depot_sites(self, samples = 1000, speed_spread = 0.1, penalty_spread = 0.2, rebuild = False,
+                             processes = 1, quantiles = (0.05, 0.5, 0.95), seed = 0, model = DEFAULT_MODEL):
+        """
+        Monte Carlo simulation of the depots' tour times under travel time variance.
+        Each trip's time is split into its same-region time and its region penalty (both from the model).
+        Every sample draws a speed factor and a penalty factor for each trip, from log-normal distributions
+        with the given spreads, giving a time of (same-region time + penalty factor x penalty)/speed factor.
+        The same trip gets the same factors in every depot's tour within a sample.
+
+        By default the nn_tour of each depot stays fixed and all samples are scored together, as
+        (samples x trips) arrays. With rebuild set to True the tours are rebuilt with nearest neighbours
+        for every sample instead, spread over worker processes when processes > 1.
+
+        The output is a dictionary of:
+        1) "depots" - the depots, in the order of Country.depots.
+        2) "tour_times" - (samples, depots) simulated tour times.
+        3) "mean" and "quantiles" - the mean and the given quantiles of each depot's tour time.
+        4) "probability_best" - the share of samples in which each depot has the fastest tour,
+        with ties broken by name and then region as in best_depot_site.
+        """
+        depots = self._depot_indices()
+        if len(depots) == 0:
+            raise ValueError('Country contains no depots')
+        settlements = self._settlement_indices()
+        rng = np.random.default_rng(seed)
+
+        if rebuild:
+            nodes = np.concatenate((depots, settlements))
+            origins, destinations = nodes[:, None], nodes[None, :]
+            #The diagonal is never used
+            with np.errstate(invalid='ignore'):
+                base_times = model.times(self._distances(origins, destinations), True, self._region_counts[destinations])
+                penalty_times = self._travel_times(origins, destinations, model) - base_times
+
+            groups = [np.concatenate(([d], np.arange(len(depots), len(nodes)))) for d in range(len(depots))]
+            ranks = [self._rank[nodes[group]] for group in groups]
+            sample_seeds = rng.integers(0, 2**63, samples)
+            chunks = np.array_split(sample_seeds, max(processes, 1))
+            tour_times = np.concatenate(_parallel_map(
+                _rebuilt_tour_times, processes,
+                *zip(*[(base_times, penalty_times, groups, ranks, chunk, speed_spread, penalty_spread, self.tie_tolerance) for chunk in chunks]),
+            ))
+
+        else:
+            tours = [self._nn_tour_indices(d, model)[0] for d in depots]
+            origins = np.concatenate([tour[:-1] for tour in tours])
+            destinations = np.concatenate([tour[1:] for tour in tours])
+
+            #Factors are drawn per distinct trip, then gathered into each tour's trips
+            trips, trip_of_leg = np.unique(np.stack((origins, destinations)), axis=1, return_inverse=True)
+            trip_of_leg = trip_of_leg.ravel()
+            trip_times = self._travel_times(trips[0], trips[1], model)
+            base_times = model.times(self._distances(trips[0], trips[1]), True, self._region_counts[trips[1]])
+            penalty_times = trip_times - base_times
 
-    def best_depot_site(self, display = True):
+            speed = np.exp(rng.normal(0.0, speed_spread, (samples, trips.shape[1])))
+            penalty = np.exp(rng.normal(0.0, penalty_spread, (samples, trips.shape[1])))
+            leg_times = ((base_times + penalty*penalty_times)/speed)[:, trip_of_leg]
+
+            tour_of_leg = np.repeat(np.arange(len(depots)), [len(tour) - 1 for tour in tours])
+            tour_times = np.zeros((samples, len(depots)))
+            np.add.at(tour_times.T, tour_of_leg, leg_times.T)
+
+        best = _tie_break(tour_times, self._rank[depots], self.tie_tolerance, axis=1)
+
+        return {
+            'depots': [self._all_locations[d] for d in depots],
+            'tour_times': tour_times,
+            'mean': tour_times.mean(axis=0),
+            'quantiles': np.quantile(tour_times, quantiles, axis=0),
+            'probability_best': np.bincount(best, minlength=len(depots))/samples,
+        }
+
+    def search_depot_sites(self, time_budget = None, deadline = None, progress = None, processes = 1, model = DEFAULT_MODEL):
+        """
+        Anytime version of best_depot_site, which can be stopped at a deadline.
+        The depots are evaluated in order of their screen_depots estimate, most promising first, so
+        a good depot is usually found early. With a deadline, screening may only use SCREEN_SHARE of the
+        time; if it can't finish in that time, the depots are evaluated in (name, region) order instead. The search stops at the deadline (a time.time() timestamp)
+        or after time_budget seconds, whichever is sooner, and a depot whose tour is not finished by then
+        is left unevaluated. After each depot is evaluated, progress is called with the number of depots
+        evaluated, the total number of depots, and the best depot and tour time so far.
+        With processes > 1 the tours run in worker processes; at the deadline, queued depots are cancelled
+        and running tours stop at their next stop.
+
+        The output is a dictionary of:
+        1) "depot" and "tour_time" - the best depot found (with the best_depot_site tie-break) and its tour time,
+        or None if no depot was evaluated in time.
+        2) "evaluated" - for each depot, in the order of Country.depots, whether its tour was fully evaluated.
+        3) "complete" - whether every depot was evaluated, in which case the result matches best_depot_site.
+        """
+        if not self.depots:
+            raise ValueError('Country contains no depots')
+        if time_budget is not None:
+            deadline = min(deadline, time.time() + time_budget) if deadline is not None else time.time() + time_budget
+
+        depots = self._depot_indices()
+        #Screening gets at most SCREEN_SHARE of the time left, after which the depots go in (name, region) order
+        screen_deadline = None if deadline is None else time.time() + SCREEN_SHARE*max(deadline - time.time(), 0)
+        estimates = self.screen_depots(deadline=screen_deadline, model=model)
+        if estimates is None:
+            order = sorted(range(len(depots)), key=lambda i: self._rank[depots[i]])
+        else:
+            order = sorted(range(len(depots)), key=lambda i: (estimates[i], self._rank[depots[i]]))
+
+        tour_times = [None]*len(depots)
+        best = None
+
+        def record(i, tour_time):
+            nonlocal best
+            if tour_time is None:
+                return
+            tour_times[i] = tour_time
+            #The best so far, with the best_depot_site tie-break (within tie_tolerance) over the evaluated depots
+            evaluated = np.array([j for j, t in enumerate(tour_times) if t is not None])
+            best = int(evaluated[_tie_break(np.array([tour_times[j] for j in evaluated]), self._rank[depots[evaluated]], self.tie_tolerance)])
+            if progress is not None:
+                n_evaluated = sum(t is not None for t in tour_times)
+                progress(n_evaluated, len(depots), self._all_locations[depots[best]], tour_times[best])
+
+        if processes > 1:
+            executor = ProcessPoolExecutor(max_workers=processes, initializer=_set_worker_country, initargs=(self,))
+            try:
+                futures = {executor.submit(_worker_tour_time, depots[i], deadline, model): i for i in order}
+                pending = set(futures)
+                while pending:
+                    timeout = None if deadline is None else max(deadline - time.time(), 0)
+                    done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        record(futures[future], future.result())
+                    if not done:
+                        break
+            finally:
+                executor.shutdown(wait=True, cancel_futures=True)
+        else:
+            for i in order:
+                if deadline is not None and time.time() > deadline:
+                    break
+                record(i, _timed_tour_time(self, depots[i], deadline, model))
+
+        return {
+            'depot': None if best is None else self._all_locations[depots[best]],
+            'tour_time': None if best is None else tour_times[best],
+            'evaluated': [tour_time is not None for tour_time in tour_times],
+            'complete': all(tour_time is not None for tour_time in tour_times),
+        }
+
+    @_validated
+    def best_depot_site(self, display = True, method = 'nn', screen_size = None, estimator = 'sample', samples = 1000,
+                        time_budget = None, deadline = None, progress = None, processes = 1, model = DEFAULT_MODEL):
         """
         This method implements the nn_tour method for each depot in the Country.
+        The tours come from the generator behind nn_tours, which shares the rest of a tour between depots
+        whose tours meet, and only the tours tied for the fastest time are kept.
         The output is the depot with the shortest tour time.
         The route taken in this fastest tour can be shown with display set to True.
         If there are multiple depots with the shortest tour time, the tie is broken using 
         the alphabetical order of depot names.
         If there is a tie in the depot names, the tie is broken using the alphabetical 
         order of their region names. 
+        Tour times within Country.tie_tolerance (relative) of the shortest count as ties.
+        Setting method to "exact" uses the optimal tours from exact_tour instead of nn_tour,
+        with the Held-Karp tables shared between all of the depots.
+        Setting method to "approx" first ranks the depots with screen_depots (using the given
+        estimator), and only runs nn_tour for the screen_size most promising depots. screen_size has
+        no default: on random Countries the best depot can rank anywhere in the screening order
+        (see approximation_error.py), so the shortlist size trades accuracy for time and must be chosen.
+        Setting method to "monte_carlo" returns the depot that most often has the fastest tour over
+        the given number of samples of simulate_depot_sites, as a choice that is robust to traffic.
+        Giving a time_budget (in seconds), deadline, progress callback or processes > 1 runs the
+        "nn" method through search_depot_sites, returning the best depot found in time with a warning
+        if not every depot could be evaluated.
+        All of the methods use the given travel time model.
         """
         if not self.depots:
             raise ValueError('Country contains no depots')
@@ -310,27 +1229,62 @@ class Country:
         depots = list(self.depots)
 
         tour_time_list = []
-        tour_list = []
+        #Only the tours tied (within tie_tolerance) for the fastest time so far are kept, and only if the route will be displayed
+        fastest_tours = {}
 
-        for depot in depots:
-            tour, tour_time = self.nn_tour(depot)
-            tour_list.append(tour)
+        def record(tour, tour_time):
             tour_time_list.append(tour_time)
+            if display == True:
+                fastest_tours[len(tour_time_list) - 1] = tour
+                tied_time = min(tour_time_list)*(1 + self.tie_tolerance)
+                for i in [i for i in fastest_tours if tour_time_list[i] > tied_time]:
+                    del fastest_tours[i]
 
-        best_tour_time = min(tour_time_list)
-        min_indices = np.where(tour_time_list == best_tour_time)[0]
+        if method == 'nn' and (time_budget is not None or deadline is not None or progress is not None or processes > 1):
+            search = self.search_depot_sites(time_budget, deadline, progress, processes, model)
+            if search['depot'] is None:
+                raise TimeoutError('No depot could be evaluated in time')
+            if not search['complete']:
+                warnings.warn(f'Ran out of time after evaluating {sum(search["evaluated"])} of {len(depots)} depots')
+            if display == True:
+                record(*self.nn_tour(search['depot'], model))
+                depots = [search['depot']]
+            else:
+                return search['depot']
 
-        best_tour_list = [tour_list[i] for i in min_indices]
-        best_depot_list = [depots[i] for i in min_indices]
+        elif method == 'nn':
+            #Tours are streamed one depot at a time, and record only keeps the tied fastest ones
+            for _, tour, tour_time in self._iter_nn_tours(self._indices_of(depots), model):
+                record(Tour(self._all_locations, tour) if display == True else None, tour_time)
+
+        elif method == 'exact':
+            for tour, tour_time in zip(*self._exact_tours(depots, model=model)):
+                record(tour, tour_time)
+
+        elif method == 'approx':
+            if screen_size is None:
+                raise ValueError('Expected a screen_size for the "approx" method')
+            estimates = self.screen_depots(estimator, model=model)
+            shortlist = sorted(range(len(depots)), key=lambda i: (estimates[i], depots[i].name, depots[i].region))
+            depots = [depots[i] for i in shortlist[:screen_size]]
+            #Tours are streamed one depot at a time, and record only keeps the tied fastest ones
+            for _, tour, tour_time in self._iter_nn_tours(self._indices_of(depots), model):
+                record(Tour(self._all_locations, tour) if display == True else None, tour_time)
+
+        elif method == 'monte_carlo':
+            probability_best = self.simulate_depot_sites(samples, model=model)['probability_best']
+            best_index = min(range(len(depots)), key=lambda i: (-probability_best[i], depots[i].name, depots[i].region))
+            if display == True:
+                print(f'The best depot is {depots[best_index]} \nIt has the fastest tour in {probability_best[best_index]:.1%} of {samples} simulated samples')
+            return depots[best_index]
 
-        if len(best_depot_list) > 1:
-            sorted_depots = sorted(best_depot_list, key=lambda location: (location.name, location.region))
-            best_depot = sorted_depots[0]
-            best_index = depots.index(best_depot)
-            best_tour = best_tour_list[best_index]
         else:
-            best_depot = best_depot_list[0]
-            best_tour = best_tour_list[0]
+            raise ValueError(f'Unknown method "{method}", expected "nn", "exact", "approx" or "monte_carlo"')
+
+        best_index = int(_tie_break(np.array(tour_time_list), self._rank[self._indices_of(depots)], self.tie_tolerance))
+        best_depot = depots[best_index]
+        best_tour_time = tour_time_list[best_index]
+        best_tour = fastest_tours.get(best_index)
 
         if display == True:
             print(f'The best depot is {best_depot} \nWith a total tour time of {best_tour_time: .2f}h \nThe route taken is:')
@@ -339,6 +1293,274 @@ class Country:
 
         return best_depot
 
+    def region_tour(self, starting_depot, processes = 1, display = False, model = DEFAULT_MODEL):
+        """
+        Cluster-first, route-second alternative to nn_tour.
+        The settlements of each region are first toured on their own with the nearest neighbours
+        algorithm (in parallel over regions when processes > 1). As there is no region penalty
+        inside a region, each of these only needs the locations of that region.
+        The regions are then visited in nearest neighbour order on a small region-level graph, using
+        the centre of each region, starting from the depot. Each region's cycle is entered at the
+        settlement that is quickest to reach from the previous stop and followed round from there.
+        The output is a chronological list of Locations visited along with the total duration in hours,
+        in the same form as nn_tour. With display set to True the tour time is printed next to the
+        nn_tour time for the same depot.
+        """
+        depot_index = int(self._indices_of([starting_depot])[0])
+        settlements = self._settlement_indices()
+
+        region_members = [settlements[self._region_codes[settlements] == code]
+            for code in np.unique(self._region_codes[settlements])]
+
+        #Each region's cycle starts from its settlement closest to the region centre
+        x = self._r*np.cos(self._theta)
+        y = self._r*np.sin(self._theta)
+        centres = np.array([(x[members].mean(), y[members].mean()) for members in region_members]).reshape(-1, 2)
+        for i, members in enumerate(region_members):
+            from_centre = np.hypot(x[members] - centres[i, 0], y[members] - centres[i, 1])
+            start = np.lexsort((self._rank[members], from_centre))[0]
+            region_members[i] = np.roll(members, -start)
+
+        cycle_inputs = [(self._r[members], self._r_squared[members], self._theta[members], self._rank[members],
+            self._region_counts[members[0]], model, self.tie_tolerance) for members in region_members]
+        orders = _parallel_map(_nn_cycle, processes if len(region_members) > 1 else 1, *zip(*cycle_inputs)) if cycle_inputs else []
+        cycles = [members[order] for members, order in zip(region_members, orders)]
+
+        #Region-level nearest neighbours between region centres, starting from the depot
+        region_codes = np.array([self._region_codes[members[0]] for members in cycles], dtype=np.int64)
+        position = np.array([x[depot_index], y[depot_index]])
+        current_region = self._region_codes[depot_index]
+        remaining = list(range(len(cycles)))
+        region_order = []
+        while remaining:
+            distance = np.hypot(centres[remaining, 0] - position[0], centres[remaining, 1] - position[1])
+            same_region = region_codes[remaining] == current_region
+            times = model.times(distance, same_region, self._region_sizes[region_codes[remaining]])
+            next_region = remaining[int(np.argmin(times))]
+            region_order.append(next_region)
+            remaining.remove(next_region)
+            position = centres[next_region]
+            current_region = region_codes[next_region]
+
+        #Stitching the region cycles together
+        tour_indices = [depot_index]
+        for i in region_order:
+            cycle = cycles[i]
+            times = self._travel_times(tour_indices[-1], cycle, model)
+            entry = int(_tie_break(times, self._rank[cycle], self.tie_tolerance))
+            tour_indices.extend(np.roll(cycle, -entry).tolist())
+        tour_indices.append(depot_index)
+
+        tour = Tour(self._all_locations, tour_indices)
+        tour_time = self._tour_time(tour_indices, model)
+
+        if display == True:
+            _, nn_tour_time = self.nn_tour(starting_depot, model)
+            print(f'Region tour time from {starting_depot}: {tour_time: .2f}h \nnn_tour time from {starting_depot}: {nn_tour_time: .2f}h')
+
+        return tour, tour_time
+
+    def best_depot_sites(self, k, processes = 1, display = True, model = DEFAULT_MODEL):
+        """
+        Chooses k depots to open together, with each settlement served by the depot that is
+        quickest to reach it, and the settlements of each depot toured with nearest neighbours.
+        The depots are chosen by a greedy facility location search, minimising the total
+        depot-to-settlement travel time, followed by swaps scored on the total tour time.
+        The greedy step scores every candidate depot at once from a depots x settlements travel time
+        block. Each swap pass tries replacing every open depot with the SWAP_CANDIDATES closed depots
+        of lowest assignment time (computed incrementally from the best and second best open depot of
+        each settlement) and makes the swap that most reduces the total tour time. A swap reassigns
+        the settlements and rebuilds only the tours of the depots whose settlements changed.
+        The final per-depot tours are run in worker processes when processes > 1.
+        The output is the chosen depots (in name, region order), their tours and their tour times.
+        """
+        if not isinstance(k, int) or isinstance(k, bool):
+            raise TypeError(f'Expected "k" to be an integer, got {type(k).__name__} instead.')
+
+        depots = self._depot_indices()
+        if not 1 <= k <= len(depots):
+            raise ValueError(f'Expected k to be between 1 and the number of depots ({len(depots)}), got {k} instead.')
+
+        settlements = self._settlement_indices()
+        times = self._travel_times(depots[:, None], settlements[None, :], model)
+        depot_rank = self._rank[depots]
+
+        def cheapest(costs):
+            return int(_tie_break(costs, depot_rank, self.tie_tolerance))
+
+        #Greedy: open the depot that most reduces the assignment time, k times
+        opened = []
+        closest = np.full(len(settlements), np.inf)
+        for _ in range(k):
+            costs = np.minimum(closest, times).sum(axis=1)
+            costs[opened] = np.inf
+            opened.append(cheapest(costs))
+            closest = np.minimum(closest, times[opened[-1]])
+
+        #Tour time of each depot and settlements assigned to it, so a swap only rebuilds the tours it changes
+        group_tour_times = {}
+
+        def total_tour_time(opened):
+            opened = sorted(opened, key=lambda i: depot_rank[i])
+            assignment = np.argmin(times[opened], axis=0)
+            total = 0.0
+            for position, i in enumerate(opened):
+                group = np.concatenate(([depots[i]], settlements[assignment == position]))
+                key = group.tobytes()
+                if key not in group_tour_times:
+                    with np.errstate(invalid='ignore'):
+                        block = self._travel_times(group[:, None], group[None, :], model)
+                    tour_indices = group[_nn_order(block, self._rank[group], self.tie_tolerance)].tolist() + [group[0]]
+                    group_tour_times[key] = self._tour_time(tour_indices, model) if len(group) > 1 else 0.0
+                total += group_tour_times[key]
+            return total
+
+        #Swaps: replace an open depot with a closed one while it reduces the total tour time
+        improved = len(settlements) > 0 and k < len(depots)
+        current_cost = total_tour_time(opened) if improved else None
+        while improved:
+            improved = False
+            open_times = times[opened]
+            by_time = np.argsort(open_times, axis=0, kind='stable')
+            best = open_times[by_time[0], np.arange(len(settlements))]
+            second = open_times[by_time[1], np.arange(len(settlements))] if k > 1 else np.full(len(settlements), np.inf)
+
+            best_swap = None
+            for position in range(k):
+                without = np.where(by_time[0] == position, second, best)
+                costs = np.minimum(without, times).sum(axis=1)
+                costs[opened] = np.inf
+                for candidate in np.lexsort((depot_rank, costs))[:min(SWAP_CANDIDATES, len(depots) - k)].tolist():
+                    swapped = opened[:position] + [candidate] + opened[position + 1:]
+                    cost = total_tour_time(swapped)
+                    if cost < current_cost:
+                        best_swap, current_cost = swapped, cost
+            if best_swap is not None:
+                opened, improved = best_swap, True
+
+        opened = sorted(opened, key=lambda i: depot_rank[i])
+        assignment = np.argmin(times[opened], axis=0) if len(settlements) else np.empty(0, dtype=np.int64)
+
+        nodes = [np.concatenate(([depots[i]], settlements[assignment == position])) for position, i in enumerate(opened)]
+        with np.errstate(invalid='ignore'):
+            blocks = [self._travel_times(group[:, None], group[None, :], model) for group in nodes]
+        ranks = [self._rank[group] for group in nodes]
+        orders = _parallel_map(_nn_order, processes if k > 1 else 1, blocks, ranks, [self.tie_tolerance]*k)
+
+        chosen_depots = [self._all_locations[depots[i]] for i in opened]
+        tours = []
+        tour_times = []
+        for group, order in zip(nodes, orders):
+            tour_indices = group[order].tolist() + [group[0]]
+            tours.append(Tour(self._all_locations, tour_indices))
+            #A depot with no settlements assigned never leaves
+            tour_times.append(self._tour_time(tour_indices, model) if len(group) > 1 else 0.0)
+
+        if display == True:
+            print(f'The best {k} depots have a total tour time of {sum(tour_times): .2f}h')
+            for depot, tour, tour_time in zip(chosen_depots, tours, tour_times):
+                print(f'{depot} serves {len(tour) - 2} settlements in {tour_time: .2f}h')
+
+        return chosen_depots, tours, tour_times
+
+    def rank_depot_candidates(self, candidates = None, processes = 1, model = DEFAULT_MODEL):
+        """
+        What-if evaluation of converting Locations of the Country into depots.
+        Each candidate is treated as the starting depot of an nn_tour, and if it is currently a
+        settlement it is left out of the settlements to visit, as it would be once converted.
+        Nothing about the Country or its Locations is changed, and the travel times between all of
+        the candidates and settlements are computed once and shared between candidates, with each
+        tour slicing out its own block only while it runs.
+        Defaults to every Location in the Country. The tours run in worker processes when processes > 1,
+        which are each sent the shared travel times once and then only the candidates' positions.
+        The output is a list of (candidate, tour time) pairs, fastest first, with ties broken by
+        name and then region as in best_depot_site. The first candidate is the one best_depot_site
+        would choose, with tour times within Country.tie_tolerance of the fastest counting as ties.
+        """
+        if candidates is None:
+            candidates = list(self._all_locations)
+
+        candidate_indices = self._indices_of(candidates)
+        settlements = self._settlement_indices()
+
+        nodes = np.union1d(candidate_indices, settlements)
+        position = np.searchsorted(nodes, candidate_indices)
+        settlement_positions = np.searchsorted(nodes, settlements)
+        #The diagonal is never used
+        with np.errstate(invalid='ignore'):
+            times = self._travel_times(nodes[:, None], nodes[None, :], model)
+
+        shared = (times, settlement_positions, self._rank[nodes], self.tie_tolerance)
+        if processes > 1:
+            with ProcessPoolExecutor(max_workers=processes, initializer=_set_worker_candidate_times, initargs=shared) as executor:
+                tour_times = list(executor.map(_worker_candidate_tour_time, position.tolist(),
+                    chunksize=max(1, len(position)//(4*processes))))
+        else:
+            tour_times = [_candidate_tour_time(*shared, p) for p in position.tolist()]
+
+        ranked = sorted(range(len(candidates)), key=lambda i: (tour_times[i], candidates[i].name, candidates[i].region))
+        if ranked:
+            first = int(_tie_break(np.array(tour_times), self._rank[candidate_indices], self.tie_tolerance))
+            ranked.remove(first)
+            ranked.insert(0, first)
+        return [(candidates[i], tour_times[i]) for i in ranked]
+
+    def write_travel_times_parquet(self, filepath, block_size = 1024, model = DEFAULT_MODEL):
+        """
+        Writes the travel time matrix between all Locations to Parquet, one row group per block of
+        block_size origins, so only one block is in memory at a time.
+        Each row is an (origin, destination, time) triple, with origin and destination as location indices
+        (see to_arrow). Trips from a Location to itself are left out.
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        schema = pa.schema([('origin', pa.int32()), ('destination', pa.int32()), ('time', pa.float64())])
+        n = len(self._all_locations)
+        destinations = np.arange(n, dtype=np.int32)
+
+        with pq.ParquetWriter(filepath, schema) as writer:
+            for first in range(0, n, block_size):
+                origins = np.arange(first, min(first + block_size, n), dtype=np.int32)
+                with np.errstate(invalid='ignore'):
+                    times = self._travel_times(origins[:, None], destinations[None, :], model)
+                keep = origins[:, None] != destinations[None, :]
+                writer.write_table(pa.table({
+                    'origin': np.broadcast_to(origins[:, None], times.shape)[keep],
+                    'destination': np.broadcast_to(destinations[None, :], times.shape)[keep],
+                    'time': times[keep],
+                }, schema=schema))
+
+    def write_tours_parquet(self, filepath, depots = None, row_group_size = 64, model = DEFAULT_MODEL):
+        """
+        Writes the nn_tour of each depot (by default every depot) to Parquet, with one row per depot holding
+        the depot's location index, its name, the tour time and the tour as a list of int32 location indices.
+        The tours are computed and written row_group_size depots at a time, so they are never all held in memory.
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        schema = pa.schema([
+            ('depot', pa.int32()),
+            ('name', pa.string()),
+            ('tour_time', pa.float64()),
+            ('tour', pa.list_(pa.int32())),
+        ])
+        depot_indices = self._depot_indices() if depots is None else self._indices_of(depots)
+
+        with pq.ParquetWriter(filepath, schema) as writer:
+            for first in range(0, len(depot_indices), row_group_size):
+                group = depot_indices[first:first + row_group_size]
+                tours, tour_times = zip(*(self._nn_tour_indices(d, model) for d in group))
+                offsets = np.concatenate(([0], np.cumsum([len(tour) for tour in tours]))).astype(np.int32)
+                values = np.concatenate(tours).astype(np.int32)
+                writer.write_table(pa.table({
+                    'depot': group.astype(np.int32),
+                    'name': [self._all_locations[d].name for d in group],
+                    'tour_time': np.array(tour_times, dtype=float),
+                    'tour': pa.ListArray.from_arrays(offsets, values),
+                }, schema=schema))
+
     def plot_country(
         self,
         distinguish_regions: bool = True,
@@ -397,7 +1619,7 @@ class Country:
 
     def plot_path(
         self,
-        path: List[Location],
+        path: List[Location] | Tour,
         distinguish_regions: bool = True,
         distinguish_depots: bool = True,
         location_names: bool = True,
@@ -423,10 +1645,10 @@ class Country:
 
         Parameters
         ----------
-        path : list
-            A list of Locations in the country, where consecutive
-            pairs are taken to mean journeys from the earlier location to
-            the following one.
+        path : list or Tour
+            A list of Locations in the country (or a Tour, as returned by
+            nn_tour), where consecutive pairs are taken to mean journeys
+            from the earlier location to the following one.
         distinguish_regions : bool, default: True,
         distinguish_depots : bool, default: True,
         location_names : bool, default: True,
@@ -0,0 +1,243 @@
+"""
+Distributed best_depot_site over several machines.
+
+A coordinator splits the depots of a Country into work units of a few depots each and listens
+for workers over TCP. Each worker that connects is sent a binary (pickled) snapshot of the Country
+and the travel time model once, then is given work units one at a time, answering each with the
+nn_tour times of its depots. A unit whose worker disconnects, or takes longer than unit_timeout,
+goes back in the queue for another worker, up to max_retries times. Workers can join at any point.
+
+After the snapshot, messages are one JSON object per line in each direction:
+Coordinator: {"unit": 0, "depots": [3, 7]} or {"stop": true}
+Worker:      {"unit": 0, "tour_times": [101.4, 99.2]}
+
+The snapshot is unpickled by the workers, so workers should only connect to a trusted coordinator.
+
+Run with: python distributed.py coordinate data/locations.csv [--port 8770] [--local-workers 2]
+     and: python distributed.py work --host coordinator-host [--port 8770]
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import pickle
+import socket
+import struct
+
+import numpy as np
+
+from country import DEFAULT_MODEL, _tie_break
+from utilities import read_country_data
+
+UNIT_SIZE = 4
+MAX_RETRIES = 3
+
+
+class Coordinator:
+    def __init__(self, country, unit_size = UNIT_SIZE, max_retries = MAX_RETRIES, unit_timeout = None, model = DEFAULT_MODEL):
+        """
+        Coordinator of a distributed best_depot_site over the depots of a Country.
+        """
+        if not country.depots:
+            raise ValueError('Country contains no depots')
+        self.country = country
+        self.max_retries = max_retries
+        self.unit_timeout = unit_timeout
+
+        self._depots = country._depot_indices()
+        self._position = {depot: i for i, depot in enumerate(self._depots.tolist())}
+        self._units = [self._depots[i:i + unit_size].tolist() for i in range(0, len(self._depots), unit_size)]
+        self._snapshot = pickle.dumps((country, model))
+        self._tour_times = [None]*len(self._depots)
+        self._failures = [0]*len(self._units)
+        self._queue = None
+        self._done = None
+        self._server = None
+        self._connections = set()
+
+    async def start(self, host = '127.0.0.1', port = 8770):
+        """
+        Starts listening for workers on host:port, with port 0 picking a free port.
+        """
+        self._queue = asyncio.Queue()
+        for unit in range(len(self._units)):
+            self._queue.put_nowait(unit)
+        self._done = asyncio.get_running_loop().create_future()
+        self._server = await asyncio.start_server(self._handle_worker, host, port)
+        return self._server
+
+    @property
+    def port(self):
+        return self._server.sockets[0].getsockname()[1]
+
+    async def result(self, timeout = None):
+        """
+        Waits for every work unit to be done and reduces the tour times, with the same (time, name, region)
+        tie-break as best_depot_site.
+        The output is a dictionary of:
+        1) "depot" and "tour_time" - the best depot and its tour time.
+        2) "tour_times" - the tour time from each depot, in the order of Country.depots.
+        3) "retries" - the number of work units that had to be sent again after a worker was lost.
+        """
+        await asyncio.wait_for(asyncio.shield(self._done), timeout)
+        tour_times = np.array(self._tour_times)
+        best = int(_tie_break(tour_times, self.country._rank[self._depots], self.country.tie_tolerance))
+        return {
+            'depot': self.country.all_locations[self._depots[best]],
+            'tour_time': self._tour_times[best],
+            'tour_times': self._tour_times,
+            'retries': sum(self._failures),
+        }
+
+    async def close(self):
+        """
+        Stops listening and tells the connected workers to stop. Workers still busy with a work unit
+        (e.g. after result timed out) are disconnected rather than waited for.
+        """
+        if self._server is not None:
+            self._server.close()
+            if not self._done.done():
+                self._done.cancel()
+            for connection in self._connections:
+                connection.cancel()
+            await asyncio.gather(*self._connections, return_exceptions=True)
+            await self._server.wait_closed()
+
+    async def _handle_worker(self, reader, writer):
+        """
+        Sends a worker the snapshot, then work units until there are none left.
+        A unit in progress when the worker is lost goes back in the queue.
+        """
+        self._connections.add(asyncio.current_task())
+        unit = None
+        try:
+            writer.write(struct.pack('!Q', len(self._snapshot)) + self._snapshot)
+            await writer.drain()
+
+            while not self._done.done():
+                get = asyncio.ensure_future(self._queue.get())
+                await asyncio.wait([get, self._done], return_when=asyncio.FIRST_COMPLETED)
+                if not get.done():
+                    get.cancel()
+                    break
+                unit = get.result()
+
+                writer.write(json.dumps({'unit': unit, 'depots': self._units[unit]}).encode() + b'\n')
+                await writer.drain()
+                line = await asyncio.wait_for(reader.readline(), self.unit_timeout)
+                if not line:
+                    raise ConnectionError('Worker disconnected')
+                self._record(unit, json.loads(line)['tour_times'])
+                unit = None
+
+            writer.write(json.dumps({'stop': True}).encode() + b'\n')
+            await writer.drain()
+        except (ConnectionError, asyncio.TimeoutError, ValueError, KeyError):
+            if unit is not None:
+                self._retry(unit)
+        finally:
+            self._connections.discard(asyncio.current_task())
+            writer.close()
+
+    def _record(self, unit, tour_times):
+        for depot, tour_time in zip(self._units[unit], tour_times):
+            self._tour_times[self._position[depot]] = tour_time
+        if all(tour_time is not None for tour_time in self._tour_times) and not self._done.done():
+            self._done.set_result(None)
+
+    def _retry(self, unit):
+        self._failures[unit] += 1
+        if self._failures[unit] > self.max_retries:
+            if not self._done.done():
+                self._done.set_exception(RuntimeError(f'Work unit {unit} failed on {self._failures[unit]} workers'))
+        else:
+            self._queue.put_nowait(unit)
+
+
+def _read_exactly(stream, size):
+    data = stream.read(size)
+    if len(data) < size:
+        raise ConnectionError('Coordinator disconnected')
+    return data
+
+
+def run_worker(host = '127.0.0.1', port = 8770):
+    """
+    Connects to a coordinator, loads its Country snapshot and evaluates work units until told to stop.
+    """
+    with socket.create_connection((host, port)) as connection:
+        stream = connection.makefile('rwb')
+        size, = struct.unpack('!Q', _read_exactly(stream, 8))
+        country, model = pickle.loads(_read_exactly(stream, size))
+
+        while line := stream.readline():
+            message = json.loads(line)
+            if message.get('stop'):
+                break
+            shared = country.nn_tours([country.all_locations[d] for d in message['depots']], model)
+            tour_times = [float(tour_time) for tour_time in shared['tour_times']]
+            stream.write(json.dumps({'unit': message['unit'], 'tour_times': tour_times}).encode() + b'\n')
+            stream.flush()
+
+
+def start_local_workers(port, processes = 2, host = '127.0.0.1'):
+    """
+    Starts worker processes on this machine, for running or testing on a single host.
+    """
+    workers = [multiprocessing.Process(target=run_worker, args=(host, port), daemon=True) for _ in range(processes)]
+    for worker in workers:
+        worker.start()
+    return workers
+
+
+async def _coordinate(country, host, port, local_workers, timeout, **kwargs):
+    coordinator = Coordinator(country, **kwargs)
+    await coordinator.start(host, port)
+    workers = start_local_workers(coordinator.port, local_workers, host)
+    finished = False
+    try:
+        result = await coordinator.result(timeout)
+        finished = True
+        return result
+    finally:
+        await coordinator.close()
+        #Workers are only told to stop between work units, so after a failure the busy ones are terminated
+        for worker in workers:
+            if not finished:
+                worker.terminate()
+            worker.join()
+
+
+def distributed_best_depot_site(country, host = '127.0.0.1', port = 0, local_workers = 2, timeout = None, **kwargs):
+    """
+    Runs a Coordinator for the Country until every depot has been evaluated, returning its result.
+    local_workers worker processes are started on this machine; workers on other machines can join
+    by running run_worker against host:port. Other keyword arguments go to Coordinator.
+    """
+    return asyncio.run(_coordinate(country, host, port, local_workers, timeout, **kwargs))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Distributed best_depot_site over TCP.')
+    subparsers = parser.add_subparsers(dest='role', required=True)
+    coordinate = subparsers.add_parser('coordinate')
+    coordinate.add_argument('filepath', help='CSV file in the format of data/locations.csv')
+    coordinate.add_argument('--host', default='0.0.0.0')
+    coordinate.add_argument('--port', type=int, default=8770)
+    coordinate.add_argument('--local-workers', type=int, default=0)
+    coordinate.add_argument('--unit-size', type=int, default=UNIT_SIZE)
+    coordinate.add_argument('--unit-timeout', type=float, default=None)
+    work = subparsers.add_parser('work')
+    work.add_argument('--host', default='127.0.0.1')
+    work.add_argument('--port', type=int, default=8770)
+    arguments = parser.parse_args()
+
+    if arguments.role == 'work':
+        run_worker(arguments.host, arguments.port)
+    else:
+        result = distributed_best_depot_site(read_country_data(arguments.filepath), arguments.host, arguments.port,
+            arguments.local_workers, unit_size=arguments.unit_size, unit_timeout=arguments.unit_timeout)
+        print(f'The best depot is {result["depot"]} \nWith a total tour time of {result["tour_time"]: .2f}h')
+        print(f'{result["retries"]} work units were retried')
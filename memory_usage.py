@@ -0,0 +1,118 @@
+import argparse
+import multiprocessing
+import resource
+import sys
+import time
+import tracemalloc
+import pandas as pd
+from country import Country
+from utilities import random_country
+
+#Memory benchmark for the core paths: for each path and number of locations N, measures the
+#wall time, the peak memory allocated while it runs (tracemalloc) and the growth of the peak
+#RSS of the process, then checks the tracemalloc peak against a bytes per location budget.
+#Each measurement runs in a freshly forked process, so the peak RSS of one doesn't hide the next.
+#Exits with status 1 if any path goes over its budget.
+
+#Default budgets, in peak bytes allocated per location, checked at every N
+BUDGETS = {
+    'country_from_dataframe': 2000,
+    'country_from_list': 1000,
+    'settlements': 50,
+    'depots': 50,
+    'nn_tour': 1000,
+    'best_depot_site': 1000,
+}
+
+
+def _setup(path, n_locations):
+    """
+    Returns the function to measure for a path, with everything it needs already built.
+    """
+    country = random_country(n_locations - n_locations//20, n_locations//20)
+    if path == 'country_from_dataframe':
+        data = pd.DataFrame({
+            'location': [location.name for location in country.all_locations],
+            'region': [location.region for location in country.all_locations],
+            'r': [location.r for location in country.all_locations],
+            'theta': [location.theta for location in country.all_locations],
+            'depot': [location.depot for location in country.all_locations],
+        })
+        return lambda: Country(data)
+    elif path == 'country_from_list':
+        locations = list(country.all_locations)
+        return lambda: Country(locations)
+    elif path == 'settlements':
+        return lambda: country.settlements
+    elif path == 'depots':
+        return lambda: country.depots
+    elif path == 'nn_tour':
+        depot = country.depots[0]
+        return lambda: country.nn_tour(depot)
+    else:
+        return lambda: country.best_depot_site(False)
+
+
+def measure(path, n_locations):
+    """
+    Returns the wall time, tracemalloc peak and peak RSS growth (both in bytes) of one run of a path.
+    """
+    function = _setup(path, n_locations)
+    #ru_maxrss is in kilobytes on Linux
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = function()
+    seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    rss_growth = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024 - rss_before
+    del result
+    return seconds, peak, rss_growth
+
+
+def _measure_in_child(arguments):
+    return measure(*arguments)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measure time and memory of the core Country paths.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 300, 1000], help='numbers of locations N')
+    parser.add_argument('--paths', nargs='+', default=list(BUDGETS), choices=list(BUDGETS))
+    parser.add_argument('--budget', nargs='+', default=[], metavar='PATH=BYTES',
+        help='peak bytes per location allowed for a path, overriding the default')
+    parser.add_argument('--output', default='memory_usage.csv', help='CSV file for the results')
+    arguments = parser.parse_args()
+
+    budgets = dict(BUDGETS)
+    for budget in arguments.budget:
+        path, bytes_per_location = budget.split('=')
+        budgets[path] = float(bytes_per_location)
+
+    context = multiprocessing.get_context('fork')
+    rows = []
+    for path in arguments.paths:
+        for n_locations in arguments.sizes:
+            with context.Pool(1, maxtasksperchild=1) as pool:
+                seconds, peak, rss_growth = pool.apply(_measure_in_child, ((path, n_locations),))
+            rows.append({
+                'path': path,
+                'n_locations': n_locations,
+                'seconds': seconds,
+                'peak_bytes': peak,
+                'peak_rss_growth_bytes': rss_growth,
+                'bytes_per_location': peak / n_locations,
+                'budget': budgets[path],
+            })
+
+    results = pd.DataFrame(rows)
+    results['over_budget'] = results['bytes_per_location'] > results['budget']
+    results.to_csv(arguments.output, index=False)
+    print(results.to_string(index=False))
+
+    over_budget = results[results['over_budget']]
+    if len(over_budget):
+        print(f'\nOver budget: {", ".join(sorted(set(over_budget["path"])))}')
+        sys.exit(1)
@@ -21,7 +21,7 @@ import matplotlib.pyplot as plt
 if TYPE_CHECKING:
     from matplotlib.figure import Figure
 
-    from country import Country, Location
+    from country import Country, Location, Tour
 
 
 def polar_to_xy(data: np.ndarray[float]) -> np.ndarray[float]:
@@ -134,7 +134,7 @@ def plot_country(
 
 def plot_path(
     country: Country,
-    path: List[Location],
+    path: List[Location] | Tour,
     distinguish_regions: bool = True,
     distinguish_depots: bool = True,
     location_names: bool = True,
@@ -158,7 +158,11 @@ def plot_path(
     is_polar = ax.name == "polar"
 
     # We just need to draw lines between the relevant points, so let's do that
-    data = np.array([(loc.theta, loc.r) for loc in path], dtype=(float, float))
+    if hasattr(path, "indices"):
+        # Tours hold location indices, so the coordinates come straight from the Country's arrays
+        data = np.column_stack((country._theta[path.indices], country._r[path.indices]))
+    else:
+        data = np.array([(loc.theta, loc.r) for loc in path], dtype=(float, float))
     if not is_polar:
         data = polar_to_xy(data)
     ax.plot(data[:, 0], data[:, 1], "--", marker=None)
@@ -0,0 +1,282 @@
+"""
+Long-running local routing service.
+
+Keeps loaded Countries (and their cached travel time arrays) warm in memory and answers
+requests over TCP or a Unix socket, one JSON object per line in each direction.
+
+Request:  {"id": 1, "country": "locations", "method": "travel_time", "params": {...}}
+Response: {"id": 1, "result": {...}} or {"id": 1, "error": "..."}
+
+Methods and their params (Locations are given by name, with an optional "region"):
+1) travel_time - "start", "end"
+2) fastest_trip_from - "location", and optionally "potential_locations"
+3) nn_tour - "depot"
+4) best_depot_site - no params
+
+Concurrent travel_time and fastest_trip_from requests arriving within batch_window seconds of
+each other are answered together with one vectorized call per Country. nn_tour and best_depot_site
+run in a pool of worker processes, which each load the Countries once when they start, so the
+event loop stays responsive.
+
+Run with: python service.py data/locations.csv [more.csv ...] [--port 8765 | --path service.sock]
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from utilities import read_country_data
+
+BATCH_WINDOW = 0.002
+
+#Countries held by each worker process, loaded once by the pool initializer
+_worker_countries = {}
+
+
+def _load_worker_countries(countries):
+    _worker_countries.update(countries)
+
+
+def _run_in_worker(country_name, method, location_index):
+    """
+    Runs one of the CPU-heavy methods in a worker process, returning plain indices and floats.
+    """
+    country = _worker_countries[country_name]
+    if method == 'nn_tour':
+        return country._nn_tour_indices(location_index)
+    else:
+        depot = country._index[country.best_depot_site(False)]
+        return depot, country._nn_tour_indices(depot)[1]
+
+
+def _describe(location):
+    return {'name': location.name, 'region': location.region}
+
+
+class RoutingService:
+    def __init__(self, countries, processes = 2, batch_window = BATCH_WINDOW):
+        """
+        Service over a dictionary of Countries, keyed by the names requests use to refer to them.
+        """
+        self.countries = dict(countries)
+        self.processes = processes
+        self.batch_window = batch_window
+
+        #Locations of each Country by name, to look up the Locations named in requests
+        self._by_name = {}
+        for country_name, country in self.countries.items():
+            names = {}
+            for location in country.all_locations:
+                names.setdefault(location.name, []).append(location)
+            self._by_name[country_name] = names
+
+        self._pending = {}
+        self._connections = {}
+        self._executor = None
+        self._server = None
+
+    @classmethod
+    def from_files(cls, filepaths, **kwargs):
+        """
+        Loads each CSV with read_country_data, naming each Country after its file.
+        """
+        return cls({Path(filepath).stem: read_country_data(filepath) for filepath in filepaths}, **kwargs)
+
+    async def start(self, host = '127.0.0.1', port = 8765, path = None):
+        """
+        Starts the worker pool and listens on the Unix socket path if given, and on host:port otherwise.
+        """
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.processes,
+            initializer=_load_worker_countries,
+            initargs=(self.countries,),
+        )
+        if path is not None:
+            self._server = await asyncio.start_unix_server(self._handle_connection, path=path)
+        else:
+            self._server = await asyncio.start_server(self._handle_connection, host, port)
+        return self._server
+
+    async def close(self):
+        """
+        Stops listening, lets open connections finish their requests and shuts down the worker pool.
+        """
+        if self._server is not None:
+            self._server.close()
+            for reader in self._connections.values():
+                reader.feed_eof()
+            await asyncio.gather(*self._connections)
+            await self._server.wait_closed()
+        if self._executor is not None:
+            self._executor.shutdown()
+
+    async def _handle_connection(self, reader, writer):
+        """
+        Reads requests line by line, answering each as soon as it is ready, so that one
+        connection can have many requests in flight.
+        """
+        write_lock = asyncio.Lock()
+        tasks = set()
+
+        async def answer(line):
+            response = await self.handle(line)
+            async with write_lock:
+                writer.write(json.dumps(response).encode() + b'\n')
+                await writer.drain()
+
+        self._connections[asyncio.current_task()] = reader
+        try:
+            while line := await reader.readline():
+                task = asyncio.ensure_future(answer(line))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            await asyncio.gather(*tasks)
+        finally:
+            del self._connections[asyncio.current_task()]
+            writer.close()
+
+    async def handle(self, line):
+        """
+        Answers a single request line, returning the response as a dictionary.
+        Any error, from a malformed request to a broken worker pool, is returned as an error response
+        so the client is never left waiting.
+        """
+        request_id = None
+        try:
+            request = json.loads(line)
+            request_id = request.get('id')
+            result = await self.call(request['country'], request['method'], request.get('params', {}))
+            return {'id': request_id, 'result': result}
+        except Exception as e:
+            return {'id': request_id, 'error': f'{type(e).__name__}: {e}'}
+
+    def _location_index(self, country_name, description):
+        """
+        Finds a Location by name, or by name and region, returning its index in the Country.
+        """
+        if isinstance(description, str):
+            description = {'name': description}
+
+        matches = self._by_name[country_name].get(description['name'], [])
+        if 'region' in description:
+            matches = [location for location in matches if location.region == description['region']]
+
+        if not matches:
+            raise ValueError(f'{description} is not a location in {country_name}')
+        if len(matches) > 1:
+            raise ValueError(f'{description} matches more than one location, give its region too')
+        return self.countries[country_name]._index[matches[0]]
+
+    async def call(self, country_name, method, params):
+        """
+        Runs a method on one of the service's Countries.
+        """
+        if country_name not in self.countries:
+            raise ValueError(f'Unknown country "{country_name}"')
+        country = self.countries[country_name]
+        loop = asyncio.get_running_loop()
+
+        if method == 'travel_time':
+            pair = (self._location_index(country_name, params['start']), self._location_index(country_name, params['end']))
+            time = await self._batched(country_name, method, pair)
+            return {'time': time}
+
+        elif method == 'fastest_trip_from':
+            origin = self._location_index(country_name, params['location'])
+            if params.get('potential_locations') is None:
+                destination, time = await self._batched(country_name, method, origin)
+            else:
+                potential = [self._location_index(country_name, location) for location in params['potential_locations']]
+                destinations, times = country._fastest_trips([origin], potential)
+                destination, time = int(destinations[0]), float(times[0])
+            if destination < 0:
+                return {'location': None, 'time': None}
+            return {'location': _describe(country.all_locations[destination]), 'time': time}
+
+        elif method == 'nn_tour':
+            depot = self._location_index(country_name, params['depot'])
+            tour, tour_time = await loop.run_in_executor(self._executor, _run_in_worker, country_name, method, depot)
+            return {'tour': [_describe(country.all_locations[i]) for i in tour], 'time': tour_time}
+
+        elif method == 'best_depot_site':
+            if not country.depots:
+                raise ValueError('Country contains no depots')
+            depot, tour_time = await loop.run_in_executor(self._executor, _run_in_worker, country_name, method, None)
+            return {'depot': _describe(country.all_locations[depot]), 'time': tour_time}
+
+        else:
+            raise ValueError(f'Unknown method "{method}"')
+
+    def _batched(self, country_name, method, item):
+        """
+        Queues an item for the next vectorized batch of this method, returning a future for its result.
+        The first item of a batch schedules the flush, batch_window seconds later.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        key = (country_name, method)
+        if key not in self._pending:
+            self._pending[key] = []
+            loop.call_later(self.batch_window, self._flush, key)
+        self._pending[key].append((item, future))
+        return future
+
+    def _flush(self, key):
+        country_name, method = key
+        country = self.countries[country_name]
+        batch = self._pending.pop(key)
+        items = [item for item, _ in batch]
+
+        try:
+            if method == 'travel_time':
+                origins, destinations = np.array(items, dtype=np.int64).T
+                results = country._travel_times(origins, destinations).tolist()
+            else:
+                destinations, times = country._fastest_trips(items)
+                results = list(zip(destinations.tolist(), times.tolist()))
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+
+async def request(reader, writer, payload):
+    """
+    Sends one request over an open connection and waits for its response.
+    Only for one request in flight per connection; responses are matched by order.
+    """
+    writer.write(json.dumps(payload).encode() + b'\n')
+    await writer.drain()
+    return json.loads(await reader.readline())
+
+
+async def serve(filepaths, host = '127.0.0.1', port = 8765, path = None, processes = 2):
+    service = RoutingService.from_files(filepaths, processes=processes)
+    server = await service.start(host, port, path)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await service.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve Country routing queries from memory.')
+    parser.add_argument('filepaths', nargs='+', help='CSV files in the format of data/locations.csv')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--path', default=None, help='Unix socket path, used instead of host and port')
+    parser.add_argument('--processes', type=int, default=2)
+    arguments = parser.parse_args()
+
+    asyncio.run(serve(arguments.filepaths, arguments.host, arguments.port, arguments.path, arguments.processes))
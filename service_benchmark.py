@@ -0,0 +1,69 @@
+import argparse
+import asyncio
+import random
+import time
+import numpy as np
+from service import RoutingService, request
+
+#Load test for the routing service: starts a service on a local port, then has many
+#concurrent clients send a mix of requests, and reports p50/p99 latency and throughput
+#for each method.
+parser = argparse.ArgumentParser(description='Load test the routing service.')
+parser.add_argument('--filepath', default='data/locations.csv')
+parser.add_argument('--clients', type=int, default=32)
+parser.add_argument('--requests', type=int, default=50, help='requests per client')
+parser.add_argument('--processes', type=int, default=2)
+parser.add_argument('--port', type=int, default=8766)
+arguments = parser.parse_args()
+
+#Share of each method in the request mix
+MIX = {'travel_time': 0.6, 'fastest_trip_from': 0.3, 'nn_tour': 0.08, 'best_depot_site': 0.02}
+
+
+async def client(service, country_name, latencies, seed):
+    rng = random.Random(seed)
+    locations = service.countries[country_name].all_locations
+    depots = service.countries[country_name].depots
+    reader, writer = await asyncio.open_connection('127.0.0.1', arguments.port)
+
+    for i in range(arguments.requests):
+        method = rng.choices(list(MIX), weights=list(MIX.values()))[0]
+        if method == 'travel_time':
+            params = {'start': rng.choice(locations).name, 'end': rng.choice(locations).name}
+        elif method == 'fastest_trip_from':
+            params = {'location': rng.choice(locations).name}
+        elif method == 'nn_tour':
+            params = {'depot': rng.choice(depots).name}
+        else:
+            params = {}
+
+        start = time.perf_counter()
+        response = await request(reader, writer, {'id': i, 'country': country_name, 'method': method, 'params': params})
+        latencies[method].append(time.perf_counter() - start)
+        assert 'error' not in response, response
+
+    writer.close()
+    await writer.wait_closed()
+
+
+async def main():
+    service = RoutingService.from_files([arguments.filepath], processes=arguments.processes)
+    await service.start(port=arguments.port)
+    country_name = next(iter(service.countries))
+    latencies = {method: [] for method in MIX}
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client(service, country_name, latencies, seed) for seed in range(arguments.clients)))
+    elapsed = time.perf_counter() - start
+    await service.close()
+
+    total = sum(len(times) for times in latencies.values())
+    print(f'{total} requests from {arguments.clients} clients in {elapsed:.2f}s: {total / elapsed:.0f} requests/s')
+    print(f'{"method":<20}{"requests":>10}{"p50 (ms)":>12}{"p99 (ms)":>12}')
+    for method, times in latencies.items():
+        if times:
+            p50, p99 = np.percentile(np.array(times) * 1000, [50, 99])
+            print(f'{method:<20}{len(times):>10}{p50:>12.2f}{p99:>12.2f}')
+
+
+asyncio.run(main())
@@ -0,0 +1,39 @@
+import pytest
+from pathlib import Path
+from batch import evaluate_countries
+from utilities import random_country, regular_n_gon
+
+
+#Testing evaluate_countries matches best_depot_site and nn_tour for each Country, in input order
+@pytest.mark.parametrize('processes, batch_size', [(1, 256), (1, 7), (2, 16)])
+def test_evaluate_countries(processes, batch_size):
+    countries = [random_country(3 + seed % 12, 1 + seed % 5, seed=seed) for seed in range(40)]
+    countries += [regular_n_gon(0), regular_n_gon(9), Path("./data/locations.csv").resolve()]
+
+    results = list(evaluate_countries(countries, processes=processes, batch_size=batch_size))
+    assert [position for position, *_ in results] == list(range(len(countries)))
+
+    for country, (_, best_depot, tour, tour_time) in zip(countries[:-1], results):
+        assert best_depot == country.best_depot_site(False)
+        assert (tour, tour_time) == country.nn_tour(best_depot)
+
+    assert results[-1][1].name == 'Whiterun Stables'
+
+#Testing a Country with no depots
+def test_evaluate_countries_no_depots():
+    countries = [random_country(5, 1), random_country(5, 0)]
+
+    with pytest.raises(ValueError) as error:
+        list(evaluate_countries(countries))
+
+    assert str(error.value) == 'Country 1 contains no depots'
+
+#Testing the lanes break ties within each Country's tie_tolerance, as nn_tour does
+def test_evaluate_countries_tie_tolerance():
+    countries = [regular_n_gon(n) for n in [11, 21, 34, 79]]
+    for country in countries:
+        country.tie_tolerance = 1e-9
+
+    for country, (_, best_depot, tour, tour_time) in zip(countries, evaluate_countries(countries)):
+        assert best_depot == country.best_depot_site(False)
+        assert (tour, tour_time) == country.nn_tour(best_depot)
@@ -1,8 +1,10 @@
 import pytest
-from country import travel_time, Location, Country
-from utilities import read_country_data
+from country import travel_time, Location, Country, Tour, TravelTimeModel, RegionPenaltyModel, DEFAULT_MODEL, _nn_order, _tie_break
+from utilities import read_country_data, read_country_shards, regular_n_gon, random_country
 from pathlib import Path
 import numpy as np
+import itertools
+import time
 
 ## TESTS FOR TRAVEL TIME FUNCTION ##
 @pytest.mark.parametrize('distance, different_regions, locations_in_dest, speed, expected_time', [
@@ -15,6 +17,11 @@ import numpy as np
 def test_travel_time(distance, different_regions, locations_in_dest, speed, expected_time):
     assert travel_time(distance, different_regions, locations_in_dest, speed) == expected_time
 
+    #The scalar and array forms of the equivalent model give the same times
+    model = RegionPenaltyModel(speed=speed)
+    assert model(distance, not different_regions, locations_in_dest) == expected_time
+    assert model.times(np.array([distance]), np.array([not different_regions]), np.array([locations_in_dest]))[0] == expected_time
+
 
 
 ## TESTS FOR LOCATION CLASS ##
@@ -327,18 +334,549 @@ def test_best_depot_site():
     assert dark_souls_tied.best_depot_site() == depot2           #Testing tied best depots, selecting first in alphabetical order by name
     assert dark_souls_name_tied.best_depot_site() == depot4      #Testing tied name alphabetical order, selecting first in alphabetical order by region
 
+#Testing region_tour visits every settlement once and reports the time of the route it returns
+def test_region_tour():
+    file_path = Path("./data/locations.csv").resolve()
+    skyrim = read_country_data(file_path)
+
+    for depot in skyrim.depots:
+        tour, tour_time = skyrim.region_tour(depot)
+
+        assert tour[0] == depot and tour[-1] == depot
+        assert sorted(tour[1:-1], key=str) == sorted(skyrim.settlements, key=str)
+        assert tour_time == pytest.approx(sum(skyrim.travel_time(a, b) for a, b in zip(tour[:-1], tour[1:])))
+
+#Testing region_tour gives the same tour when the regions are toured in worker processes
+def test_region_tour_parallel():
+    file_path = Path("./data/locations.csv").resolve()
+    skyrim = read_country_data(file_path)
+    depot = skyrim.depots[0]
+
+    assert skyrim.region_tour(depot, processes=2) == skyrim.region_tour(depot)
+
+#Testing region_tour with no settlements stays at the depot
+def test_region_tour_no_settlements():
+    country = regular_n_gon(0)
+    depot = country.depots[0]
+
+    assert country.region_tour(depot) == ([depot, depot], 0)
+
+#Testing region_tour prints its tour time next to the nn_tour time
+def test_region_tour_display(capsys):
+    country = regular_n_gon(6)
+    depot = country.depots[0]
+
+    _, tour_time = country.region_tour(depot, display=True)
+    _, nn_tour_time = country.nn_tour(depot)
+    captured = capsys.readouterr()
+
+    assert f'{tour_time: .2f}h' in captured.out
+    assert f'nn_tour time from {depot}: {nn_tour_time: .2f}h' in captured.out
+
+#Testing exact_tour finds the fastest tour, checked against every ordering of the settlements
+def test_exact_tour():
+    depot = Location('Firelink Shrine', 'Wimbledon', 0, 0, True)
+    settlements = [
+        Location('Anor Londo', 'Croydon', 120000, -0.08, False),
+        Location('Undead Asylum', 'Kingston', 80000, 1.4, False),
+        Location('Crystal Cave', 'Tooting Broadway', 60000, -1.9, False),
+        Location('Izalith', 'Kingston', 90000, 2.4, False),
+        Location('Blighttown', 'Croydon', 40000, 0.9, False),
+    ]
+    dark_souls = Country([depot] + settlements)
+
+    tour, tour_time = dark_souls.exact_tour(depot)
+    fastest_time = min(
+        sum(dark_souls.travel_time(a, b) for a, b in zip((depot,) + order, order + (depot,)))
+        for order in itertools.permutations(settlements)
+    )
+
+    assert tour[0] == depot and tour[-1] == depot
+    assert sorted(tour[1:-1], key=str) == sorted(settlements, key=str)
+    assert tour_time == pytest.approx(fastest_time)
+    assert tour_time <= dark_souls.nn_tour(depot)[1]
+
+#Testing best_depot_site with the exact method, which shares the solver tables between depots
+def test_best_depot_site_exact():
+    file_path = Path("./data/locations.csv").resolve()
+    skyrim = read_country_data(file_path)
 
+    exact_times = {depot.name: skyrim.exact_tour(depot)[1] for depot in skyrim.depots}
 
+    assert skyrim.best_depot_site(False, method='exact').name == min(exact_times, key=exact_times.get)
 
+#Testing the exact solver splits the depots into chunks whose tables fit in MAX_EXACT_TABLE_BYTES
+def test_exact_tours_chunks(monkeypatch):
+    import tracemalloc
+    from country import _held_karp_bytes
 
+    country = random_country(10, 40, seed=2)
 
+    def run():
+        tracemalloc.start()
+        tours, tour_times = country._exact_tours(country.depots)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return tours, tour_times, peak
 
+    tours, tour_times, peak = run()
+    monkeypatch.setattr('country.MAX_EXACT_TABLE_BYTES', _held_karp_bytes(3, 10))
+    chunked_tours, chunked_tour_times, chunked_peak = run()
 
+    assert (chunked_tours, chunked_tour_times) == (tours, tour_times)
+    assert chunked_peak < 2*_held_karp_bytes(3, 10) < peak
 
+#Testing the exact solver falls back to nn_tour above the settlement limit, and invalid methods
+def test_exact_tour_limit():
+    country = regular_n_gon(5)
+    depot = country.depots[0]
 
+    with pytest.warns(UserWarning) as warning:
+        tour, tour_time = country.exact_tour(depot, max_settlements=4)
+
+    assert str(warning[0].message) == '5 settlements is above the exact solver limit of 4, using nn_tour instead'
+    assert (tour, tour_time) == country.nn_tour(depot)
+
+    with pytest.raises(ValueError) as error:
+        country.best_depot_site(False, method='Harambe')
+
+    assert str(error.value) == 'Unknown method "Harambe", expected "nn", "exact", "approx" or "monte_carlo"'
+
+#Testing best_depot_sites splits the settlements between the chosen depots and tours each with nn_tour
+def test_best_depot_sites():
+    file_path = Path("./data/locations.csv").resolve()
+    skyrim = read_country_data(file_path)
+
+    depots, tours, tour_times = skyrim.best_depot_sites(2, display=False)
+    visited = [location for tour in tours for location in tour[1:-1]]
+
+    assert len(depots) == 2 and all(depot.depot for depot in depots)
+    assert sorted(visited, key=str) == sorted(skyrim.settlements, key=str)
+    assert [tour[0] for tour in tours] == depots
+    assert tour_times == [pytest.approx(sum(skyrim.travel_time(a, b) for a, b in zip(tour[:-1], tour[1:]))) for tour in tours]
+    assert skyrim.best_depot_sites(2, processes=2, display=False) == (depots, tours, tour_times)
+
+    #With one depot, every settlement is assigned to it
+    (depot,), (tour,), (tour_time,) = skyrim.best_depot_sites(1, display=False)
+    assert (tour, tour_time) == skyrim.nn_tour(depot)
+
+#Testing no single swap of an open depot for a closed one reduces the total tour time of best_depot_sites
+@pytest.mark.parametrize('seed', range(5))
+def test_best_depot_sites_swaps(seed):
+    country = random_country(30, 6, seed=seed)
+    depots, tours, tour_times = country.best_depot_sites(2, display=False)
+    settlements = country._settlement_indices()
+
+    def total_tour_time(pair):
+        pair = sorted(pair, key=lambda location: (location.name, location.region))
+        assignment = np.argmin(country._travel_times(country._indices_of(pair)[:, None], settlements[None, :]), axis=0)
+        total = 0.0
+        for position, depot in enumerate(pair):
+            group = np.concatenate((country._indices_of([depot]), settlements[assignment == position]))
+            with np.errstate(invalid='ignore'):
+                block = country._travel_times(group[:, None], group[None, :])
+            total += country._tour_time(group[_nn_order(block, country._rank[group])].tolist() + [group[0]])
+        return total
+
+    assert sum(tour_times) == pytest.approx(total_tour_time(depots))
+    for kept in depots:
+        for other in country.depots:
+            if other not in depots:
+                assert sum(tour_times) <= total_tour_time([kept, other]) + 1e-9
+
+#Testing invalid numbers of depots to open
+@pytest.mark.parametrize('k, error_type, error_message', [
+    (0, ValueError, 'Expected k to be between 1 and the number of depots (5), got 0 instead.'),
+    (6, ValueError, 'Expected k to be between 1 and the number of depots (5), got 6 instead.'),
+    (1.5, TypeError, 'Expected "k" to be an integer, got float instead.'),
+    ])
+
+def test_best_depot_sites_invalid(k, error_type, error_message):
+    file_path = Path("./data/locations.csv").resolve()
+    skyrim = read_country_data(file_path)
+
+    with pytest.raises(error_type) as error:
+        skyrim.best_depot_sites(k, display=False)
+
+    assert str(error.value) == error_message
 
+#Testing rank_depot_candidates matches rebuilding the Country with each candidate converted into a depot
+def test_rank_depot_candidates():
+    file_path = Path("./data/locations.csv").resolve()
+    skyrim = read_country_data(file_path)
+    depot_status = [location.depot for location in skyrim.all_locations]
 
+    ranked = skyrim.rank_depot_candidates()
 
+    assert [location.depot for location in skyrim.all_locations] == depot_status
+    assert len(ranked) == len(skyrim.all_locations)
+    assert [tour_time for _, tour_time in ranked] == sorted(tour_time for _, tour_time in ranked)
+
+    for candidate, tour_time in ranked:
+        converted = [Location(location.name, location.region, location.r, location.theta, location.depot or location == candidate)
+            for location in skyrim.all_locations]
+        assert Country(converted).nn_tour(candidate)[1] == tour_time
+
+    assert skyrim.rank_depot_candidates(skyrim.settlements[:4], processes=2) == skyrim.rank_depot_candidates(skyrim.settlements[:4])
+
+    #The best existing depot ranks first among the depots
+    assert skyrim.rank_depot_candidates(skyrim.depots)[0][0] == skyrim.best_depot_site(False)
+
+    #Only the shared travel times and one candidate's block are held at a time, not a block per candidate
+    import tracemalloc
+    country = random_country(200, 10)
+    tracemalloc.start()
+    country.rank_depot_candidates()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert peak < 5*8*len(country.all_locations)**2
+
+#Testing the depot screening estimators, and that the mst estimate is a lower bound on the tour time
+def test_screen_depots():
+    country = random_country(40, 8, seed=4)
+    tour_times = np.array([country.nn_tour(depot)[1] for depot in country.depots])
+
+    sample_estimates = country.screen_depots('sample')
+    mst_estimates = country.screen_depots('mst')
+
+    assert sample_estimates.shape == mst_estimates.shape == (8,)
+    assert np.all(mst_estimates <= tour_times)
+
+    with pytest.raises(ValueError) as error:
+        country.screen_depots('Harambe')
 
+    assert str(error.value) == 'Unknown estimator "Harambe", expected "sample" or "mst"'
 
+#Testing best_depot_site with screening matches the full search when every depot is refined
+@pytest.mark.parametrize('estimator', ['sample', 'mst'])
+def test_best_depot_site_approx(estimator):
+    file_path = Path("./data/locations.csv").resolve()
+    skyrim = read_country_data(file_path)
 
+    best_depot = skyrim.best_depot_site(False)
+
+    assert skyrim.best_depot_site(False, method='approx', screen_size=skyrim.n_depots, estimator=estimator) == best_depot
+    assert skyrim.best_depot_site(False, method='approx', screen_size=1, estimator=estimator) in skyrim.depots
+
+    #The shortlist size has to be chosen
+    with pytest.raises(ValueError) as error:
+        skyrim.best_depot_site(False, method='approx', estimator=estimator)
+
+    assert str(error.value) == 'Expected a screen_size for the "approx" method'
+
+
+#Travel time model that only defines the array form, with no region penalty
+class NoPenaltyModel(TravelTimeModel):
+    def times(self, distance, same_region, locations_in_dest_region):
+        return distance / 36000 + 0 * locations_in_dest_region
+
+#Testing Country methods use the travel time model they are given
+def test_travel_time_models():
+    file_path = Path("./data/locations.csv").resolve()
+    skyrim = read_country_data(file_path)
+    depot = skyrim.depots[0]
+    model = NoPenaltyModel()
+
+    tour, tour_time = skyrim.nn_tour(depot, model)
+    assert tour_time == pytest.approx(sum(skyrim.travel_time(a, b, model) for a, b in zip(tour[:-1], tour[1:])))
+    assert skyrim.travel_time(tour[0], tour[1], model) == tour[0].distance_to(tour[1]) / 36000
+
+    #Twice the speed gives the same tours in half the time
+    fast_tour, fast_tour_time = skyrim.nn_tour(depot, RegionPenaltyModel(speed=9.5))
+    assert (fast_tour, fast_tour_time) == (skyrim.nn_tour(depot)[0], pytest.approx(skyrim.nn_tour(depot, DEFAULT_MODEL)[1] / 2))
+
+    best_depot = skyrim.best_depot_site(False, model=model)
+    assert skyrim.rank_depot_candidates(skyrim.depots, model=model)[0] == (best_depot, skyrim.nn_tour(best_depot, model)[1])
+    assert skyrim.region_tour(depot, processes=2, model=model) == skyrim.region_tour(depot, model=model)
+    assert skyrim.exact_tour(depot, model=model)[1] <= tour_time
+
+    with pytest.raises(NotImplementedError):
+        skyrim.nn_tour(depot, TravelTimeModel())
+
+#Testing the Monte Carlo simulation of tour times
+def test_simulate_depot_sites():
+    file_path = Path("./data/locations.csv").resolve()
+    skyrim = read_country_data(file_path)
+    tour_times = [skyrim.nn_tour(depot)[1] for depot in skyrim.depots]
+
+    simulation = skyrim.simulate_depot_sites(2000, seed=1)
+
+    assert simulation['depots'] == skyrim.depots
+    assert simulation['tour_times'].shape == (2000, 5)
+    assert simulation['quantiles'].shape == (3, 5)
+    assert simulation['probability_best'].sum() == pytest.approx(1)
+    assert simulation['mean'] == pytest.approx(tour_times, rel=0.1)
+
+    #With no variance every sample is the deterministic tour time, with or without rebuilding the tours
+    for rebuild in [False, True]:
+        fixed = skyrim.simulate_depot_sites(5, speed_spread=0, penalty_spread=0, rebuild=rebuild)
+        assert fixed['tour_times'] == pytest.approx(np.tile(tour_times, (5, 1)))
+        assert list(fixed['probability_best']) == [depot == skyrim.best_depot_site(False) for depot in skyrim.depots]
+
+    #Rebuilt tours are the same whether or not they run in worker processes
+    rebuilt = skyrim.simulate_depot_sites(50, rebuild=True)['tour_times']
+    assert np.array_equal(skyrim.simulate_depot_sites(50, rebuild=True, processes=2)['tour_times'], rebuilt)
+
+#Testing best_depot_site picks the depot most likely to be fastest in the Monte Carlo mode
+def test_best_depot_site_monte_carlo(capsys):
+    file_path = Path("./data/locations.csv").resolve()
+    skyrim = read_country_data(file_path)
+
+    probability_best = skyrim.simulate_depot_sites(500)['probability_best']
+    best_depot = skyrim.best_depot_site(method='monte_carlo', samples=500)
+    captured = capsys.readouterr()
+
+    assert best_depot == skyrim.depots[np.argmax(probability_best)]
+    assert f'fastest tour in {probability_best.max():.1%} of 500 simulated samples' in captured.out
+
+#Testing tours are returned as compact index arrays that still behave as lists of Locations
+def test_tour(capsys, tmp_path):
+    depot1 = Location('Firelink Shrine', 'Wimbledon', 0, 0, True)
+    depot2 = Location('Anor Londo', 'Croydon', 50000, 0, True)
+    settlement1 = Location('Undead Asylum', 'Kingston', 100000, 0, False)
+    settlement2 = Location('Crystal Cave', 'Tooting Broadway', 150000, 0, False)
+    dark_souls = Country([depot1, depot2, settlement1, settlement2])
+
+    tour, _ = dark_souls.nn_tour(depot1)
+
+    assert isinstance(tour, Tour)
+    assert tour.indices.dtype == np.int32 and list(tour.indices) == [0, 2, 3, 0]
+    assert len(tour) == 4 and tour[1] == settlement1 and tour[-1] == depot1
+    assert tour[1:3] == [settlement1, settlement2] and isinstance(tour[1:3], Tour)
+    assert settlement2 in tour and tour.index(settlement2) == 2
+    assert str(tour) == str([depot1, settlement1, settlement2, depot1])
+
+    dark_souls.best_depot_site()
+    captured = capsys.readouterr()
+    assert captured.out.endswith(f'\t{depot2}\n\t{settlement1}\n\t{settlement2}\n\t{depot2}\n')
+
+    import matplotlib
+    matplotlib.use('Agg')
+    dark_souls.plot_path(tour, save_to=tmp_path / 'tour.png')
+    assert (tmp_path / 'tour.png').exists()
+
+#Testing iter_nn_tour streams the nn_tour one stop at a time, with a stop limit and early stopping
+def test_iter_nn_tour():
+    file_path = Path("./data/locations.csv").resolve()
+    skyrim = read_country_data(file_path)
+    depot = skyrim.depots[0]
+    tour, tour_time = skyrim.nn_tour(depot)
+
+    steps = list(skyrim.iter_nn_tour(depot))
+
+    assert [stop for stop, _, _ in steps] == list(tour[1:])
+    assert [leg_time for _, leg_time, _ in steps] == [skyrim.travel_time(a, b) for a, b in zip(tour[:-1], tour[1:])]
+    assert steps[-1][2] == tour_time
+    assert [cumulative_time for _, _, cumulative_time in steps] == pytest.approx(np.cumsum([leg_time for _, leg_time, _ in steps]))
+
+    #Three settlements and then back to the depot
+    limited = list(skyrim.iter_nn_tour(depot, max_stops=3))
+    assert [stop for stop, _, _ in limited] == list(tour[1:4]) + [depot]
+    assert limited[-1][1] == skyrim.travel_time(tour[3], depot)
+
+    first_stop = next(skyrim.iter_nn_tour(depot))
+    assert first_stop == steps[0]
+
+#Testing the anytime depot search, its progress callback and stopping at the deadline
+@pytest.mark.parametrize('processes', [1, 2])
+def test_search_depot_sites(processes):
+    file_path = Path("./data/locations.csv").resolve()
+    skyrim = read_country_data(file_path)
+    best_depot = skyrim.best_depot_site(False)
+    calls = []
+
+    search = skyrim.search_depot_sites(time_budget=60, processes=processes, progress=lambda *args: calls.append(args))
+
+    assert search['complete'] and search['evaluated'] == [True]*5
+    assert (search['depot'], search['tour_time']) == (best_depot, skyrim.nn_tour(best_depot)[1])
+    assert [call[:2] for call in calls] == [(i, 5) for i in range(1, 6)]
+    assert calls[-1][2:] == (search['depot'], search['tour_time'])
+
+    #Nothing can be evaluated once the deadline has passed
+    late = skyrim.search_depot_sites(deadline=0, processes=processes)
+    assert late == {'depot': None, 'tour_time': None, 'evaluated': [False]*5, 'complete': False}
+
+#Testing best_depot_site with a time budget
+def test_best_depot_site_time_budget():
+    file_path = Path("./data/locations.csv").resolve()
+    skyrim = read_country_data(file_path)
+
+    assert skyrim.best_depot_site(False, time_budget=60) == skyrim.best_depot_site(False)
+
+    with pytest.raises(TimeoutError) as error:
+        skyrim.best_depot_site(False, time_budget=0)
+
+    assert str(error.value) == 'No depot could be evaluated in time'
+
+#Testing the Arrow / Parquet round trip and the Parquet exports
+def test_parquet(tmp_path):
+    pa = pytest.importorskip('pyarrow')
+    pq = pytest.importorskip('pyarrow.parquet')
+    import pandas as pd
+
+    file_path = Path("./data/locations.csv").resolve()
+    skyrim = read_country_data(file_path)
+
+    skyrim.to_parquet(tmp_path / 'locations.parquet')
+    assert Country.from_parquet(tmp_path / 'locations.parquet').all_locations == skyrim.all_locations
+
+    #Single chunk float64 columns are used without a copy
+    table = pa.Table.from_pandas(pd.read_csv(file_path))
+    from_table = Country.from_arrow(table)
+    assert np.shares_memory(from_table._r, table.column('r').chunk(0).to_numpy())
+    assert from_table.best_depot_site(False) == skyrim.best_depot_site(False)
+
+    with pytest.raises(ValueError) as error:
+        Country.from_arrow(pa.Table.from_pandas(pd.read_csv(Path("./data/test_duplicate_locs.csv").resolve())))
+
+    assert str(error.value) == 'Duplicate locations found'
+
+    skyrim.write_travel_times_parquet(tmp_path / 'times.parquet', block_size=7)
+    assert pq.ParquetFile(tmp_path / 'times.parquet').metadata.num_row_groups == 3
+    times = pq.read_table(tmp_path / 'times.parquet').to_pylist()
+    locations = skyrim.all_locations
+    assert len(times) == len(locations)*(len(locations) - 1)
+    assert all(row['time'] == skyrim.travel_time(locations[row['origin']], locations[row['destination']]) for row in times)
+
+    skyrim.write_tours_parquet(tmp_path / 'tours.parquet', row_group_size=2)
+    assert pq.ParquetFile(tmp_path / 'tours.parquet').metadata.num_row_groups == 3
+    for row, depot in zip(pq.read_table(tmp_path / 'tours.parquet').to_pylist(), skyrim.depots):
+        tour, tour_time = skyrim.nn_tour(depot)
+        assert (locations[row['depot']], row['name'], row['tour_time']) == (depot, depot.name, tour_time)
+        assert row['tour'] == tour.indices.tolist()
+
+#Testing reading a Country split over several CSV files
+@pytest.mark.parametrize('use_processes', [False, True])
+def test_read_country_shards(tmp_path, use_processes):
+    import pandas as pd
+
+    file_path = Path("./data/locations.csv").resolve()
+    skyrim = read_country_data(file_path)
+    data = pd.read_csv(file_path)
+    for region, shard in data.groupby('region'):
+        shard.to_csv(tmp_path / f'{region}.csv', index=False)
+
+    country, timings = read_country_shards(tmp_path, processes=3, use_processes=use_processes)
+
+    assert set(country.all_locations) == set(skyrim.all_locations)
+    assert country.best_depot_site(False) == skyrim.best_depot_site(False)
+    assert timings['locations'].sum() == len(skyrim.all_locations)
+    assert len(timings) == data['region'].nunique()
+
+    #A location repeated in another shard is a duplicate
+    data.iloc[:1].to_csv(tmp_path / 'extra.csv', index=False)
+    with pytest.raises(ValueError) as error:
+        read_country_shards(str(tmp_path / '*.csv'))
+
+    assert str(error.value) == 'Duplicate locations found'
+
+    #A missing depot value is rejected as by read_country_data, not read as True
+    (tmp_path / 'extra.csv').unlink()
+    shard = data[data['region'] == data['region'].iloc[0]].astype({'depot': object})
+    shard.iloc[0, shard.columns.get_loc('depot')] = None
+    shard.to_csv(tmp_path / f'{data["region"].iloc[0]}.csv', index=False)
+    for read in [lambda: read_country_shards(tmp_path, use_processes=use_processes),
+            lambda: read_country_data(tmp_path / f'{data["region"].iloc[0]}.csv')]:
+        with pytest.raises(TypeError) as error:
+            read()
+        assert str(error.value) == 'Expected "depot" to be a boolean, got float instead.'
+
+#Testing that the memoized nn_tours match independent nn_tour runs
+def test_nn_tours():
+    file_path = Path("./data/locations.csv").resolve()
+    for country in [read_country_data(file_path), random_country(200, 20, seed=1), regular_n_gon(12)]:
+        shared = country.nn_tours()
+        assert [(tour, tour_time) for tour, tour_time in zip(shared['tours'], shared['tour_times'])] == [country.nn_tour(depot) for depot in country.depots]
+
+    #Tours from the depots of a larger random Country meet, so later tours reuse earlier ones
+    shared = random_country(200, 20, seed=1).nn_tours()
+    assert shared['hits'] > 0 and shared['stops_reused'] > 0 and shared['seconds_saved'] > 0
+
+#Testing nn_tours with a memo too small to hold every tour, and with a memoized state at every stop
+@pytest.mark.parametrize('stride, stops_per_settlement', [(16, 1), (1, 8), (3, 0)])
+def test_nn_tours_memo_bounds(monkeypatch, stride, stops_per_settlement):
+    monkeypatch.setattr('country.NN_MEMO_STRIDE', stride)
+    monkeypatch.setattr('country.NN_MEMO_STOPS_PER_SETTLEMENT', stops_per_settlement)
+    country = random_country(200, 20, seed=1)
+
+    shared = country.nn_tours()
+
+    assert [(tour, tour_time) for tour, tour_time in zip(shared['tours'], shared['tour_times'])] == [country.nn_tour(depot) for depot in country.depots]
+    assert (shared['hits'] > 0) == (stops_per_settlement > 0)
+    assert country.best_depot_site(False) == min(country.depots, key=lambda depot: (country.nn_tour(depot)[1], depot.name, depot.region))
+
+#Testing tie-breaking with a relative tolerance
+def test_tie_tolerance():
+    #Around a regular n-gon, both neighbours of a settlement are equally close, but rounding can make either one
+    #the closest; with a tolerance the tour always goes around in name order
+    for n in [11, 21, 34, 79]:
+        country = regular_n_gon(n)
+        country.tie_tolerance = 1e-9
+        tour, tour_time = country.nn_tour(country.depots[0])
+        assert list(tour[1:-1]) == country.settlements
+
+        #Every other nearest neighbours path uses the same tolerance
+        (_,), (sites_tour,), _ = country.best_depot_sites(1, display=False)
+        assert list(sites_tour) == list(tour)
+        assert country.rank_depot_candidates(country.depots)[0][1] == pytest.approx(tour_time)
+        assert list(country.region_tour(country.depots[0])[0][1:-1]) == country.settlements
+
+    #The same choice whether the times are float32 or float64
+    rng = np.random.default_rng(0)
+    times = 1 + rng.integers(0, 3, (100, 20))*1e-3 + rng.normal(0, 1e-12, (100, 20))
+    rank = rng.permutation(20)
+    choice = _tie_break(times, rank, 1e-6, axis=1)
+    assert np.array_equal(choice, _tie_break(times.astype(np.float32), rank, 1e-6, axis=1))
+    assert np.array_equal(times[np.arange(100), choice] - times.min(axis=1) < 1e-6, [True]*100)
+
+    #Depots whose tour times are within the tolerance are decided by name
+    file_path = Path("./data/locations.csv").resolve()
+    skyrim = read_country_data(file_path)
+    skyrim.tie_tolerance = 1.0
+    first_by_name = min(skyrim.depots, key=lambda depot: (depot.name, depot.region))
+    assert skyrim.best_depot_site(False) == first_by_name
+    assert skyrim.best_depot_site(False, time_budget=60) == first_by_name
+    assert skyrim.search_depot_sites()['depot'] == first_by_name
+    assert skyrim.rank_depot_candidates(skyrim.depots)[0][0] == first_by_name
+
+#Testing the compact Cartesian mode against the float64 polar reference
+@pytest.mark.parametrize('dtype', [np.float32, np.float64])
+def test_compact_coordinates(dtype):
+    file_path = Path("./data/locations.csv").resolve()
+    for country in [read_country_data(file_path), random_country(300, 20), random_country(14, 5, seed=3)]:
+        best_depot = country.best_depot_site(False)
+        tour, tour_time = country.nn_tour(best_depot)
+        indices = np.arange(len(country.all_locations))
+        country.use_compact_coordinates(np.float64)
+        reference_distances = country._distances(indices[:, None], indices[None, :])
+
+        country.use_compact_coordinates(dtype)
+        distances = country._distances(indices[:, None], indices[None, :])
+        u = np.finfo(dtype).eps/2
+        assert distances.dtype == np.float64
+        assert np.all(np.abs(distances - reference_distances) <= 4*u*country._r.max() + 2*u*reference_distances)
+
+        assert country.best_depot_site(False) == best_depot
+        compact_tour, compact_tour_time = country.nn_tour(best_depot)
+        assert compact_tour == tour
+        assert compact_tour_time == pytest.approx(tour_time, rel=1e-6)
+
+        country.use_compact_coordinates(None)
+        assert country.nn_tour(best_depot) == (tour, tour_time)
+
+#Testing the anytime search keeps to a budget smaller than the cost of screening the depots
+def test_search_depot_sites_budget_below_screening():
+    country = random_country(1500, 100)
+    budget = 0.5
+    start = time.time()
+    assert country.screen_depots(deadline=start + 0.05) is None
+
+    start = time.time()
+    search = country.search_depot_sites(time_budget=budget)
+    elapsed = time.time() - start
+
+    assert elapsed < budget + 0.25
+    assert 0 < sum(search['evaluated']) < 100 and not search['complete']
+    #Without the screening estimates the depots are evaluated in (name, region) order
+    first = min(country.depots, key=lambda depot: (depot.name, depot.region))
+    assert search['evaluated'][country.depots.index(first)]
@@ -0,0 +1,68 @@
+import asyncio
+import json
+import pytest
+import struct
+from pathlib import Path
+from distributed import Coordinator, distributed_best_depot_site, start_local_workers
+from utilities import read_country_data, random_country
+
+
+#Testing the distributed search matches best_depot_site and nn_tour, with local worker processes
+@pytest.mark.parametrize('unit_size', [1, 2, 10])
+def test_distributed_best_depot_site(unit_size):
+    file_path = Path("./data/locations.csv").resolve()
+    skyrim = read_country_data(file_path)
+
+    result = distributed_best_depot_site(skyrim, local_workers=2, timeout=60, unit_size=unit_size)
+
+    assert result['depot'] == skyrim.best_depot_site(False)
+    assert result['tour_times'] == [skyrim.nn_tour(depot)[1] for depot in skyrim.depots]
+    assert result['tour_time'] == skyrim.nn_tour(result['depot'])[1]
+    assert result['retries'] == 0
+
+async def run_with_lost_worker(country, max_retries):
+    coordinator = Coordinator(country, unit_size=3, max_retries=max_retries)
+    await coordinator.start(port=0)
+
+    #A worker that takes a unit and then disconnects without answering
+    reader, writer = await asyncio.open_connection('127.0.0.1', coordinator.port)
+    size, = struct.unpack('!Q', await reader.readexactly(8))
+    await reader.readexactly(size)
+    unit = json.loads(await reader.readline())
+    writer.close()
+    await writer.wait_closed()
+
+    workers = start_local_workers(coordinator.port, 1) if max_retries > 0 else []
+    try:
+        return unit, await coordinator.result(60)
+    finally:
+        await coordinator.close()
+        for worker in workers:
+            worker.join()
+
+#Testing a unit from a lost worker is retried on another worker, or fails after max_retries
+def test_lost_worker():
+    country = random_country(40, 7)
+
+    unit, result = asyncio.run(run_with_lost_worker(country, 1))
+
+    assert unit['unit'] == 0 and len(unit['depots']) == 3
+    assert result['retries'] == 1
+    assert result['depot'] == country.best_depot_site(False)
+    assert result['tour_times'] == [country.nn_tour(depot)[1] for depot in country.depots]
+
+    with pytest.raises(RuntimeError) as error:
+        asyncio.run(run_with_lost_worker(country, 0))
+
+    assert str(error.value) == 'Work unit 0 failed on 1 workers'
+
+#Testing the search gives up close to its timeout, without waiting for the work units in progress
+def test_distributed_timeout():
+    import time
+    country = random_country(4000, 16)
+
+    start = time.time()
+    with pytest.raises(asyncio.TimeoutError):
+        distributed_best_depot_site(country, local_workers=2, timeout=0.5)
+
+    assert time.time() - start < 2.5
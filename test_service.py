@@ -0,0 +1,86 @@
+import asyncio
+import pytest
+from pathlib import Path
+from service import RoutingService, request
+
+
+async def run_requests(service, payloads):
+    server = await service.start(port=0)
+    port = server.sockets[0].getsockname()[1]
+
+    async def send(payload):
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        response = await request(reader, writer, payload)
+        writer.close()
+        await writer.wait_closed()
+        return response
+
+    try:
+        return await asyncio.gather(*(send(payload) for payload in payloads))
+    finally:
+        await service.close()
+
+
+@pytest.fixture
+def service():
+    return RoutingService.from_files([Path("./data/locations.csv").resolve()], processes=1)
+
+
+#Testing concurrent (batched) travel_time and fastest_trip_from requests match the Country methods
+def test_batched_requests(service):
+    skyrim = service.countries['locations']
+    locations = skyrim.all_locations
+    pairs = [(locations[i], locations[-1 - i]) for i in range(8)]
+
+    payloads = [{'id': i, 'country': 'locations', 'method': 'travel_time', 'params': {'start': start.name, 'end': end.name}}
+        for i, (start, end) in enumerate(pairs)]
+    payloads += [{'id': 8 + i, 'country': 'locations', 'method': 'fastest_trip_from', 'params': {'location': location.name}}
+        for i, location in enumerate(locations[:4])]
+
+    responses = asyncio.run(run_requests(service, payloads))
+
+    for (start, end), response in zip(pairs, responses[:8]):
+        assert response['result']['time'] == skyrim.travel_time(start, end)
+
+    for location, response in zip(locations[:4], responses[8:]):
+        closest_location, fastest_time = skyrim.fastest_trip_from(location)
+        assert response['result'] == {'location': {'name': closest_location.name, 'region': closest_location.region}, 'time': fastest_time}
+
+#Testing the tours run in the worker processes, and error responses
+def test_worker_requests(service):
+    skyrim = service.countries['locations']
+    depot = skyrim.depots[1]
+
+    responses = asyncio.run(run_requests(service, [
+        {'id': 1, 'country': 'locations', 'method': 'nn_tour', 'params': {'depot': {'name': depot.name, 'region': depot.region}}},
+        {'id': 2, 'country': 'locations', 'method': 'best_depot_site'},
+        {'id': 3, 'country': 'locations', 'method': 'nn_tour', 'params': {'depot': 'Harambe'}},
+        {'id': 4, 'country': 'Harambe', 'method': 'nn_tour'},
+        [1, 2],
+    ]))
+
+    tour, tour_time = skyrim.nn_tour(depot)
+    best_depot = skyrim.best_depot_site(False)
+
+    assert responses[0]['result'] == {'tour': [{'name': location.name, 'region': location.region} for location in tour], 'time': tour_time}
+    assert responses[1]['result'] == {'depot': {'name': best_depot.name, 'region': best_depot.region}, 'time': skyrim.nn_tour(best_depot)[1]}
+    assert responses[2] == {'id': 3, 'error': "ValueError: {'name': 'Harambe'} is not a location in locations"}
+    assert responses[3] == {'id': 4, 'error': 'ValueError: Unknown country "Harambe"'}
+    assert responses[4] == {'id': None, 'error': "AttributeError: 'list' object has no attribute 'get'"}
+
+#Testing a request that fails in the worker pool still gets an error response
+def test_broken_pool(service):
+    depot = service.countries['locations'].depots[0]
+
+    async def run():
+        server = await service.start(port=0)
+        service._executor.shutdown()
+        reader, writer = await asyncio.open_connection('127.0.0.1', server.sockets[0].getsockname()[1])
+        try:
+            return await asyncio.wait_for(request(reader, writer, {'id': 1, 'country': 'locations', 'method': 'nn_tour', 'params': {'depot': depot.name}}), 10)
+        finally:
+            writer.close()
+            await service.close()
+
+    response = asyncio.run(run())
+    assert response['id'] == 1 and response['error'].startswith('RuntimeError')
@@ -0,0 +1,95 @@
+import json
+import logging
+import pytest
+import numpy as np
+from pathlib import Path
+from country import DEFAULT_MODEL, Country, Location
+from utilities import read_country_data, regular_n_gon, random_country
+import validation
+from validation import reference_best_depot_site, reference_fastest_trip_from, reference_nn_tour
+
+
+def random_countries(n_countries, seed = 0):
+    """
+    Generator of randomized test Countries: regular n-gons of random sizes (whose settlements are all
+    equally far from the depot, so ties are common) and random Countries of random shapes.
+    """
+    rng = np.random.default_rng(seed)
+    for _ in range(n_countries):
+        if rng.random() < 0.3:
+            yield regular_n_gon(int(rng.integers(0, 30)))
+        else:
+            yield random_country(int(rng.integers(0, 40)), int(rng.integers(1, 6)), int(rng.integers(1, 6)), int(rng.integers(0, 2**31)))
+
+
+#Testing the optimized methods against the references on randomized Countries
+@pytest.mark.parametrize('seed', range(4))
+def test_randomized_against_reference(seed):
+    for country in random_countries(10, seed):
+        for depot in country.depots:
+            assert country.nn_tour(depot) == reference_nn_tour(country, depot)
+        for location in country.all_locations[:5]:
+            assert country.fastest_trip_from(location) == reference_fastest_trip_from(country, location)
+        if country.settlements:
+            assert country.best_depot_site(False) == reference_best_depot_site(country)
+
+#Testing the validation mode finds no divergences in the optimized methods
+def test_validation_mode(caplog):
+    file_path = Path("./data/locations.csv").resolve()
+    for country in [read_country_data(file_path), *random_countries(5)]:
+        country.enable_validation(rate=1.0, seed=0)
+        with caplog.at_level(logging.WARNING, logger='validation'):
+            country.best_depot_site(False)
+            for depot in country.depots:
+                country.nn_tour(depot)
+                country.fastest_trip_from(depot)
+
+        assert country.validation_stats['checked'] > 0
+        assert country.validation_stats['divergences'] == 0
+        assert caplog.records == []
+
+#Testing a divergence is logged with the inputs needed to reproduce it
+def test_validation_divergence(caplog):
+    country = random_country(20, 2)
+    country.enable_validation(rate=1.0, seed=0)
+    #Corrupting the cached coordinates of one settlement makes the vectorized methods diverge
+    country._r[0] *= 2
+    country._r_squared[0] = country._r[0]**2
+
+    with caplog.at_level(logging.WARNING, logger='validation'):
+        tour, _ = country.nn_tour(country.depots[0])
+
+    assert country.validation_stats['divergences'] > 0
+    logged = [json.loads(record.getMessage()) for record in caplog.records]
+    nn_tour_divergence = [divergence for divergence in logged if divergence['method'] == 'nn_tour'][0]
+
+    #The logged inputs rebuild a Country whose reference time along the logged tour is the logged one
+    locations = [Location(l['name'], l['region'], l['r'], l['theta'], l['depot']) for l in nn_tour_divergence['locations']]
+    rebuilt = Country(locations)
+    by_name = {location.name: location for location in rebuilt.all_locations}
+    logged_tour = [by_name[location['name']] for location in nn_tour_divergence['optimized']['tour']]
+    assert [location.name for location in tour] == [location.name for location in logged_tour]
+    assert validation._Reference(rebuilt, DEFAULT_MODEL).tour_time(logged_tour)[0] == nn_tour_divergence['reference']['tour_time']
+
+#Testing the validation mode samples about the given share of calls, each fastest_trip_from being two
+#calls (fastest_trip_from and the travel time kernel)
+def test_validation_rate():
+    country = regular_n_gon(10)
+    country.enable_validation(rate=0.1, seed=1)
+    for _ in range(500):
+        country.fastest_trip_from(country.depots[0])
+
+    assert 60 <= country.validation_stats['checked'] <= 140
+    assert country.validation_stats['divergences'] == 0
+
+#Testing the compact mode's rounding isn't reported as a divergence
+def test_validation_compact():
+    country = random_country(200, 10, seed=3)
+    country.use_compact_coordinates(np.float32)
+    country.enable_validation(rate=1.0, seed=0)
+    for depot in country.depots[:3]:
+        country.nn_tour(depot)
+        country.fastest_trip_from(depot)
+    country.best_depot_site(False)
+    assert country.validation_stats['checked'] > 0
+    assert country.validation_stats['divergences'] == 0
@@ -1,6 +1,10 @@
 from __future__ import annotations
 
+import glob
 import string
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
 
 import numpy as np
 
@@ -13,6 +17,64 @@ def read_country_data(filepath):
     return Country((pd.read_csv(filepath)))
 
 
+def _read_shard(filepath):
+    """
+    Parses one CSV shard into columns, returning them with the time taken.
+    """
+    start = time.perf_counter()
+    data = pd.read_csv(filepath)
+    columns = {
+        'location': data['location'].to_numpy(dtype=object),
+        'region': data['region'].to_numpy(dtype=object),
+        'r': data['r'].to_numpy(dtype=float),
+        'theta': data['theta'].to_numpy(dtype=float),
+        #Depot values are passed through as they are, so that Location rejects any that aren't booleans
+        'depot': data['depot'].to_numpy(dtype=object) if 'depot' in data else np.full(len(data), False, dtype=object),
+    }
+    return columns, time.perf_counter() - start
+
+
+def read_country_shards(path, processes = 4, use_processes = False):
+    """
+    Reads a Country split over several CSV files in the format of data/locations.csv (e.g. one per region).
+    path is a directory, whose .csv files are all read, or a glob pattern such as "data/regions/*.csv".
+    The shards are parsed concurrently on a pool of processes threads (or processes, if use_processes is True)
+    and merged, in sorted file order, into one Country.
+    Location names must be unique across all the shards, as in read_country_data; this is checked by hashing the
+    names of each shard, so only names whose hashes collide are compared.
+    Returns the Country and a DataFrame with the number of locations and the parsing time of each shard.
+    """
+    filepaths = sorted(glob.glob(str(Path(path) / '*.csv')) if Path(path).is_dir() else glob.glob(str(path)))
+    if not filepaths:
+        raise ValueError(f'No CSV files found at {path}')
+
+    pool = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+    with pool(max_workers=processes) as executor:
+        shards = list(executor.map(_read_shard, filepaths))
+
+    names = np.concatenate([columns['location'] for columns, _ in shards])
+    hashes = pd.util.hash_array(names)
+    _, inverse, counts = np.unique(hashes, return_inverse=True, return_counts=True)
+    #Equal hashes are almost always equal names, but compare the names themselves in case of a collision
+    candidates = names[counts[inverse] > 1]
+    if len(set(candidates)) != len(candidates):
+        raise ValueError('Duplicate locations found')
+
+    country = Country._from_columns(
+        names,
+        np.concatenate([columns['region'] for columns, _ in shards]),
+        np.concatenate([columns['r'] for columns, _ in shards]),
+        np.concatenate([columns['theta'] for columns, _ in shards]),
+        np.concatenate([columns['depot'] for columns, _ in shards]),
+    )
+    timings = pd.DataFrame({
+        'shard': filepaths,
+        'locations': [len(columns['location']) for columns, _ in shards],
+        'seconds': [seconds for _, seconds in shards],
+    })
+    return country, timings
+
+
 def regular_n_gon(number_of_settlements: int) -> Country:
     """
     Returns a Country that has a single depot and number_of_settlements settlements.
@@ -77,3 +139,39 @@ def regular_n_gon(number_of_settlements: int) -> Country:
             for i, theta in enumerate(polar_angles)
         ]
     return Country(settlements + [origin])
+
+
+def random_country(
+    number_of_settlements: int,
+    number_of_depots: int,
+    number_of_regions: int = 5,
+    seed: int = 0,
+) -> Country:
+    """
+    Returns a Country with randomly placed settlements and depots, for benchmarking and testing
+    alongside regular_n_gon.
+    Each region covers an equal wedge of angles, and locations are spread uniformly over the disc
+    of radius 100000 within their region's wedge. Settlements are named "Settlement 1", ... and
+    depots "Depot 1", ..., and regions "Region 1", ...
+    The same seed always produces the same Country.
+    """
+    rng = np.random.default_rng(seed)
+    n_locations = number_of_settlements + number_of_depots
+
+    #Uniform over the disc, so radius goes as the square root
+    r = 100000 * np.sqrt(rng.uniform(0.0, 1.0, n_locations))
+    region = rng.integers(0, number_of_regions, n_locations)
+    wedge = 2 * np.pi / number_of_regions
+    theta = -np.pi + wedge * (region + rng.uniform(0.0, 1.0, n_locations))
+
+    locations = [
+        Location(
+            f"Depot {i - number_of_settlements + 1}" if i >= number_of_settlements else f"Settlement {i + 1}",
+            f"Region {region[i] + 1}",
+            float(r[i]),
+            float(theta[i]),
+            bool(i >= number_of_settlements),
+        )
+        for i in range(n_locations)
+    ]
+    return Country(locations)
@@ -0,0 +1,265 @@
+"""
+Differential validation of the optimized Country methods against reference implementations.
+
+The references follow the original definitions one Location at a time: every travel time comes
+from Location.distance_to and the scalar form of the model (as in Country.travel_time, with the
+region sizes counted once), nearest neighbours are found by looping over the candidates, and ties
+go to the first Location by name and then region (within Country.tie_tolerance, as in the optimized
+methods).
+
+Validation is switched on per Country with Country.enable_validation. A sampled share of calls to
+the vectorized travel time kernel, fastest_trip_from, nn_tour and best_depot_site is then checked,
+and any divergence is logged as a warning on the "validation" logger, as JSON with everything
+needed to reproduce it (the method, its arguments, what was sampled, the model, the tie and compact
+settings and the Country's Locations). Each check costs O(N) scalar travel times, apart from the
+best_depot_site check, which also reruns two optimized nn_tours:
+1) travel time kernel - one sampled pair of the block.
+2) fastest_trip_from - the whole call.
+3) nn_tour - one sampled step of the tour, and the tour time summed along the returned tour.
+4) best_depot_site - the chosen depot against one sampled depot, and the tour time of the chosen depot.
+
+In compact mode (Country.use_compact_coordinates), times are allowed to differ by the compact
+error bound of each trip, and nearest neighbours that are tied to within that bound count as agreeing.
+"""
+from __future__ import annotations
+
+import inspect
+import json
+import logging
+import math
+from collections import Counter
+
+import numpy as np
+
+from country import DEFAULT_MODEL
+
+logger = logging.getLogger(__name__)
+
+
+def _tied_first(locations, times, tolerance):
+    """
+    Position of the fastest time, with ties (within the relative tolerance) going to the first Location
+    by name and then region.
+    """
+    fastest = min(times)
+    tied = [i for i, time in enumerate(times) if (time <= fastest*(1 + tolerance) if tolerance else time == fastest)]
+    return min(tied, key=lambda i: (locations[i].name, locations[i].region))
+
+
+def _compact_rtol(country, distance):
+    """
+    Relative error allowed for a trip of the given distance by the compact mode's error bound.
+    """
+    if country._x is None:
+        return 0.0
+    u = np.finfo(country._x.dtype).eps/2
+    return 4*u*float(country._r.max())/distance + 2*u if distance > 0 else math.inf
+
+
+class _Reference:
+    """
+    Scalar travel times of a Country, one pair at a time, with the region sizes counted once.
+    """
+    def __init__(self, country, model):
+        self.country = country
+        self.model = model
+        self.region_counts = Counter(location.region for location in country.all_locations)
+
+    def time(self, start, end):
+        return self.model(start.distance_to(end), start.region == end.region, self.region_counts[end.region])
+
+    def fastest(self, current, candidates):
+        times = [self.time(current, location) for location in candidates]
+        closest = _tied_first(candidates, times, self.country.tie_tolerance)
+        return candidates[closest], times[closest], times
+
+    def tour_time(self, tour):
+        """
+        Tour time summed in order, as in nn_tour, with the total error the compact mode allows.
+        """
+        tour_time, slack = 0, 0.0
+        for start, end in zip(tour[:-1], tour[1:]):
+            time = self.time(start, end)
+            distance = start.distance_to(end)
+            tour_time = tour_time + time
+            slack += time*_compact_rtol(self.country, distance) if distance > 0 else 0.0
+        return tour_time, slack
+
+
+def reference_fastest_trip_from(country, current_location, potential_locations = None, model = DEFAULT_MODEL):
+    if potential_locations is None:
+        potential_locations = [location for location in country.settlements if location != current_location]
+    potential_locations = [country.get_location(location) if isinstance(location, int) else location
+        for location in potential_locations]
+    if not potential_locations:
+        return None, None
+
+    closest_location, time, _ = _Reference(country, model).fastest(current_location, potential_locations)
+    return closest_location, time
+
+
+def reference_nn_tour(country, starting_depot, model = DEFAULT_MODEL):
+    """
+    Full reference nn_tour, O(N^2) scalar travel times; for tests rather than sampled checks.
+    """
+    reference = _Reference(country, model)
+    remaining = list(country.settlements)
+    tour = [starting_depot]
+    while remaining:
+        closest_location, _, _ = reference.fastest(tour[-1], remaining)
+        tour.append(closest_location)
+        remaining.remove(closest_location)
+    tour.append(starting_depot)
+    return tour, reference.tour_time(tour)[0]
+
+
+def reference_best_depot_site(country, model = DEFAULT_MODEL):
+    """
+    Full reference best_depot_site, O(D N^2) scalar travel times; for tests rather than sampled checks.
+    """
+    depots = country.depots
+    tour_times = [reference_nn_tour(country, depot, model)[1] for depot in depots]
+    return depots[_tied_first(depots, tour_times, country.tie_tolerance)]
+
+
+def _times_agree(optimized, reference, rtol, slack = 0.0):
+    if optimized is None or reference is None:
+        return optimized is None and reference is None
+    return optimized == reference or abs(optimized - reference) <= rtol*abs(reference) + slack
+
+
+def _choice_agrees(country, reference, current, candidates, optimized_location, optimized_time, rtol):
+    """
+    Whether a nearest neighbour choice agrees with the reference one. In compact mode, a different
+    choice still agrees if the two are tied to within the compact error bound.
+    """
+    closest_location, closest_time, times = reference.fastest(current, candidates)
+    if optimized_location == closest_location:
+        distance = current.distance_to(closest_location)
+        return optimized_time is None or _times_agree(optimized_time, closest_time, rtol + _compact_rtol(country, distance))
+    if country._x is None or optimized_location not in candidates:
+        return False
+    time = times[candidates.index(optimized_location)]
+    bound = 2*max(_compact_rtol(country, current.distance_to(optimized_location)), _compact_rtol(country, current.distance_to(closest_location)))
+    return time <= closest_time*(1 + country.tie_tolerance)*(1 + bound)
+
+
+def _describe(value):
+    """
+    JSON form of an argument or result, with Locations given in full so they can be rebuilt.
+    """
+    if hasattr(value, 'depot') and hasattr(value, 'theta'):
+        return {'name': value.name, 'region': value.region, 'r': float(value.r), 'theta': float(value.theta), 'depot': bool(value.depot)}
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, dict):
+        return {name: _describe(item) for name, item in value.items()}
+    if isinstance(value, (list, tuple)) or hasattr(value, 'indices'):
+        return [_describe(item) for item in value]
+    if isinstance(value, np.generic):
+        return value.item()
+    if hasattr(value, '__dict__'):
+        return {'class': type(value).__name__, **{k: _describe(v) for k, v in vars(value).items()}}
+    return value
+
+
+def check(country, method_name, args, kwargs, result):
+    """
+    Checks one call of an optimized method against the reference, logging a warning if they differ.
+    Returns True if they agree.
+    """
+    arguments = inspect.signature(getattr(type(country), method_name)).bind(country, *args, **kwargs)
+    arguments.apply_defaults()
+    arguments = dict(arguments.arguments)
+    del arguments['self']
+    model = arguments['model']
+    reference = _Reference(country, model)
+    rtol = country.validation_rtol
+    random = country._validation_random
+    locations = country.all_locations
+
+    if method_name == '_travel_times':
+        #One sampled pair of the block, away from the unused diagonal
+        origins, destinations = np.broadcast_arrays(arguments['origins'], arguments['destinations'])
+        result = np.broadcast_to(result, origins.shape)
+        off_diagonal = np.flatnonzero(origins != destinations)
+        if len(off_diagonal) == 0:
+            return True
+        k = int(off_diagonal[random.randrange(len(off_diagonal))])
+        start, end = locations[int(origins.flat[k])], locations[int(destinations.flat[k])]
+        arguments = {'start_location': start, 'end_location': end, 'model': model}
+        method_name, sample = 'travel_time', None
+        optimized, expected = float(result.flat[k]), reference.time(start, end)
+        agree = _times_agree(optimized, expected, rtol + _compact_rtol(country, start.distance_to(end)))
+
+    elif method_name == 'fastest_trip_from':
+        current, candidates = arguments['current_location'], arguments['potential_locations']
+        if candidates is None:
+            candidates = [location for location in country.settlements if location != current]
+        candidates = [country.get_location(location) if isinstance(location, int) else location for location in candidates]
+        sample = None
+        optimized = result
+        if not candidates:
+            expected = (None, None)
+            agree = optimized == expected
+        else:
+            expected = reference.fastest(current, candidates)[:2]
+            agree = _choice_agrees(country, reference, current, candidates, optimized[0], optimized[1], rtol)
+
+    elif method_name == 'nn_tour':
+        #One sampled step of the tour, and the tour time along the whole tour
+        tour, tour_time = result
+        tour = list(tour)
+        expected_time, slack = reference.tour_time(tour)
+        agree = _times_agree(tour_time, expected_time, rtol, slack)
+        sample = {'step': None}
+        if len(tour) > 2:
+            step = random.randrange(len(tour) - 2)
+            visited = set(tour[1:step + 1])
+            candidates = [location for location in country.settlements if location not in visited]
+            sample = {'step': step}
+            agree = agree and _choice_agrees(country, reference, tour[step], candidates, tour[step + 1], None, rtol)
+            expected_step = reference.fastest(tour[step], candidates)[0]
+            sample['reference_stop'] = expected_step
+        optimized = {'tour': tour, 'tour_time': tour_time}
+        expected = {'tour_time': expected_time}
+
+    else:
+        #Only the plain nearest neighbours method has a reference
+        if arguments['method'] != 'nn':
+            return True
+        #The chosen depot against one sampled depot, both toured with the optimized nn_tour
+        depots = country.depots
+        best = result
+        other = depots[random.randrange(len(depots))]
+        best_tour, best_time = country._nn_tour_indices(country._index[best], model)
+        _, other_time = country._nn_tour_indices(country._index[other], model)
+        expected_time, slack = reference.tour_time([locations[i] for i in best_tour])
+        tolerance = country.tie_tolerance
+        if other == best:
+            in_order = True
+        elif tolerance:
+            in_order = best_time <= other_time*(1 + tolerance)
+        else:
+            in_order = (best_time, best.name, best.region) < (other_time, other.name, other.region)
+        agree = in_order and _times_agree(best_time, expected_time, rtol, slack)
+        sample = {'other_depot': other, 'other_tour_time': other_time}
+        optimized = {'depot': best, 'tour_time': best_time}
+        expected = {'tour_time': expected_time}
+
+    country.validation_stats['checked'] += 1
+    if agree:
+        return True
+
+    country.validation_stats['divergences'] += 1
+    logger.warning(json.dumps({
+        'method': method_name,
+        'arguments': {name: _describe(value) for name, value in arguments.items()},
+        'sample': _describe(sample),
+        'optimized': _describe(optimized),
+        'reference': _describe(expected),
+        'tie_tolerance': country.tie_tolerance,
+        'compact': None if country._x is None else country._x.dtype.name,
+        'locations': _describe(list(locations)),
+    }))
+    return False